@@ -1,11 +1,86 @@
 from utils import get_sb_environment
+from agent import validate_edit_safety as _validate_edit_safety
+import atexit
+import os
+import queue
+import re
 import subprocess
 import shlex
+import tempfile
+import threading
+import uuid
+from pathlib import PurePosixPath
+
+# Prefix for all git invocations in the tools below:
+# - --no-optional-locks skips the index-refresh stat-walk (and .git lockfile)
+# - core.quotepath=false keeps non-ASCII paths unescaped for stable parsing
+# - diff.renames=false avoids O(n^2) rename detection on large change sets
+GIT = "git --no-optional-locks -c core.quotepath=false -c diff.renames=false"
+
+try:
+    import numpy as _np
+except ImportError:  # numpy is in requirements but keep the tools usable without it
+    _np = None
+
+
+def _newline_offsets(data: bytes) -> list:
+    """
+    Byte offsets of every b'\\n' in data.
+
+    Uses numpy's vectorized scan when available (SIMD at C speed); otherwise
+    falls back to repeated bytes.find, which is still a C-level loop per line.
+    """
+    if _np is not None:
+        arr = _np.frombuffer(data, dtype=_np.uint8)
+        return _np.flatnonzero(arr == 0x0A).tolist()
+    offsets = []
+    pos = data.find(b"\n")
+    while pos != -1:
+        offsets.append(pos)
+        pos = data.find(b"\n", pos + 1)
+    return offsets
+
+
+# Matches real test locations (tests/ directories, test_*.py, *_test.py, and
+# Django-style test.py/tests.py modules) without the false positives of the
+# raw '/test' substring check, which also fired on paths like src/latest/utils.py
+_TEST_PATH_RE = re.compile(r"(^|/)tests?(/|$)|(^|/)test_[^/]*\.py$|_test\.py$|(^|/)tests?\.py$")
+
+
+def _is_test_path(file_path: str) -> bool:
+    """True if file_path points inside a test directory or at a test module."""
+    parts = PurePosixPath(file_path).parts
+    if any(p in ("test", "tests") or p.startswith("test_") for p in parts):
+        return True
+    return _TEST_PATH_RE.search(file_path) is not None
+
 
 class LimitsExceeded(Exception):
     """Raised when the agent has reached its step limit."""
 
 
+class _StrEnv:
+    """
+    Normalize env.execute's return type to str once, at the boundary.
+
+    minisweagent backends variously return a plain string or a dict with an
+    "output" key; converting here lets every tool drop its per-call
+    `isinstance(output, dict)` branch from the hot path.
+    """
+
+    def __init__(self, inner):
+        self._inner = inner
+
+    def execute(self, command, **kwargs):
+        result = self._inner.execute(command, **kwargs)
+        if isinstance(result, dict):
+            return result.get("output", str(result))
+        return result if isinstance(result, str) else str(result)
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+
 class SWEEnvironment:
     """
     Minimal interface to the SWEBench execution environment.
@@ -15,8 +90,54 @@ class SWEEnvironment:
     """
 
     def __init__(self, instance: dict):
-        self.env = get_sb_environment(instance)
-     
+        self.env = _StrEnv(get_sb_environment(instance))
+        # Monotonic counter bumped on every successful edit; read-only caches
+        # (like the Python file listing) are keyed on it for invalidation
+        self._edit_epoch = 0
+        self._py_files_cache = (-1, None)
+        # Probe once whether the backend accepts an argv list. When it does,
+        # simple commands can skip /bin/sh entirely (one fork instead of two)
+        try:
+            self.env.execute(["true"])
+            self._argv_ok = True
+        except Exception:
+            self._argv_ok = False
+
+    def _exec_argv(self, argv: list) -> str:
+        """
+        Run a simple command from an argv list, bypassing shell parsing when
+        the backend supports it; falls back to a shlex-quoted shell string.
+        """
+        if self._argv_ok:
+            output = self.env.execute(argv)
+        else:
+            output = self.env.execute(" ".join(shlex.quote(a) for a in argv))
+        return output
+
+    def _py_files(self) -> list:
+        """
+        List of Python files in the repo, cached until the next edit.
+
+        The listing is also materialized to /tmp/swe_pyfiles.txt inside the
+        environment so follow-up greps can consume it via xargs instead of
+        re-walking the tree.
+        """
+        epoch, cached = self._py_files_cache
+        if cached is not None and epoch == self._edit_epoch:
+            return cached
+        try:
+            # env.execute, not run_bash_cmd: the listing is internal read-only
+            # plumbing and must not bump the edit epoch it is keyed on
+            output = self.env.execute(
+                "{ rg --files -t py 2>/dev/null || find . -name '*.py' -not -path '*/.git/*'; } "
+                "| tee /tmp/swe_pyfiles.txt"
+            )
+            files = output.split()
+        except Exception:
+            files = []
+        self._py_files_cache = (self._edit_epoch, files)
+        return files
+
     # -------------------- REQUIRED TOOLS --------------------
     def run_bash_cmd(self, command: str) -> str:
         """
@@ -29,11 +150,14 @@ class SWEEnvironment:
         Returns:
             The output of running the shell command
         """
+        # Arbitrary agent shell can edit files (sed -i, heredocs, git apply),
+        # so treat every call to this tool as a potential edit and invalidate
+        # the epoch-keyed caches. Internal read-only plumbing (file views,
+        # greps, the _py_files listing) goes through self.env.execute directly
+        # so it cannot flush the caches it feeds.
+        self._edit_epoch += 1
         try:
             output = self.env.execute(command)
-            # Handle dict return type from minisweagent
-            if isinstance(output, dict):
-                output = output.get("output", str(output))
         except subprocess.TimeoutExpired as e:
             output = e.output.decode("utf-8", errors="replace") if e.output else ""
             raise ValueError(output)
@@ -45,13 +169,13 @@ class SWEEnvironment:
         """Return a concise summary of current changes (status + diff)."""
         try:
             scope = shlex.quote(path) if path else ""
-            status = self.env.execute("git status --porcelain")
-            if isinstance(status, dict):
-                status = status.get("output", str(status))
-            diff = self.env.execute(f"git --no-pager diff --unified=0 {scope}")
-            if isinstance(diff, dict):
-                diff = diff.get("output", str(diff))
-            return f"STATUS:\n{status}\n\nDIFF (u=0):\n{diff}"
+            # Status and diff in one shell call, split on a sentinel line
+            output = self.env.execute(
+                f"{GIT} status --porcelain; printf '\\n===GIT_SUMMARY===\\n'; "
+                f"{GIT} --no-pager diff --unified=0 {scope}"
+            )
+            status, _, diff = output.partition("===GIT_SUMMARY===")
+            return f"STATUS:\n{status.rstrip()}\n\nDIFF (u=0):\n{diff.lstrip()}"
         except Exception as e:
             return f"Error getting git diff summary: {e}"
     
@@ -61,29 +185,33 @@ class SWEEnvironment:
         """
         try:
             # IMPROVEMENT #1: Better diagnostics for patch generation failures
-            # First verify files were actually changed
-            status = self.env.execute("git status --porcelain")
-            if isinstance(status, dict):
-                status = status.get("output", str(status))
-            
-            if not status.strip():
+            # First verify files were actually changed. status --porcelain
+            # (head -n1 stops at the first hit) rather than ls-files -m -o:
+            # the latter misses staged-only changes, and the agent does run
+            # git add itself via run_bash_cmd.
+            changed = self.env.execute(f"{GIT} status --porcelain | head -n1")
+
+            if not changed.strip():
                 return f"{result}\n\nWARNING: No file changes detected by git. Agent may have failed to write files correctly."
             
-            # Show what will be included in the patch
-            self.env.execute("git add -A")
-            patch_output = self.env.execute("git diff --cached")
-            
-            # Handle dict return type from minisweagent
-            if isinstance(patch_output, dict):
-                patch_output = patch_output.get("output", str(patch_output))
-            
-            if patch_output.strip():
-                return patch_output
+            # Stage, then answer "anything staged?" via exit code only —
+            # --quiet moves one digit over the exec channel instead of a diff
+            # that can run to tens of MB on large repos
+            probe = self.env.execute(
+                f"{GIT} add -A && {GIT} diff --cached --quiet; echo $?"
+            )
+
+            if not probe.strip().endswith("0"):
+                # Non-zero exit: staged changes exist, serialize the diff once
+                patch_output = self.env.execute(
+                    f"{GIT} diff --cached --no-color --no-ext-diff"
+                )
+
+                if patch_output.strip():
+                    return patch_output
             
             # Fallback: try without staging
-            unstaged_patch = self.env.execute("git diff HEAD")
-            if isinstance(unstaged_patch, dict):
-                unstaged_patch = unstaged_patch.get("output", str(unstaged_patch))
+            unstaged_patch = self.env.execute(f"{GIT} diff HEAD --no-color --no-ext-diff")
             
             if unstaged_patch.strip():
                 return unstaged_patch
@@ -99,7 +227,7 @@ class SWEEnvironment:
         """
         try:
             # VALIDATION 1: Prevent modifying test files (they should already be correct!)
-            if '/test' in file_path or file_path.startswith('test'):
+            if _is_test_path(file_path):
                 raise ValueError(
                     f"⛔ BLOCKED: Cannot modify test file '{file_path}'!\n"
                     f"Test files define the requirements - they should NOT be changed.\n"
@@ -112,78 +240,77 @@ class SWEEnvironment:
             from_line = int(from_line)
             to_line = int(to_line)
             
-            # Read the current file content
-            read_output = self.env.execute(f"cat {file_path}")
-            # Handle dict return type from minisweagent
-            if isinstance(read_output, dict):
-                read_output = read_output.get("output", str(read_output))
-            lines = read_output.split('\n')
-            
             # Validate line numbers (1-indexed)
             if from_line < 1 or to_line < 1:
                 raise ValueError("Line numbers must be >= 1")
             if from_line > to_line:
                 raise ValueError("from_line must be <= to_line")
-            if to_line > len(lines):
-                raise ValueError(f"to_line {to_line} exceeds file length {len(lines)}")
-            
+
+            # sed silently truncates a span past EOF, which would run the
+            # safety check below against the wrong old content — validate the
+            # range against the real line count first
+            wc_out = self.env.execute(f"wc -l < {shlex.quote(file_path)}").strip()
+            try:
+                newline_count = int(wc_out.split()[0])
+            except (ValueError, IndexError):
+                raise ValueError(f"Cannot read {file_path}: {wc_out}")
+            # split('\n') in the splice script yields newline_count+1 entries
+            if to_line > newline_count + 1:
+                raise ValueError(f"to_line {to_line} exceeds file length {newline_count + 1}")
+
             # VALIDATION 2: Check for catastrophic edits (V3 FIX)
-            # Extract old content that will be replaced
-            old_content_lines = lines[from_line-1:to_line]
-            old_content = '\n'.join(old_content_lines)
-            
-            # Import and call validation function
-            from agent import validate_edit_safety
-            validate_edit_safety(file_path, from_line, to_line, old_content, content)
-            
-            # Replace the lines (convert to 0-indexed)
-            # Split content on newlines so multi-line replacements work correctly
-            content_lines = content.split('\n')
-            new_lines = lines[:from_line-1] + content_lines + lines[to_line:]
-            new_content = '\n'.join(new_lines)
-            
-            # Write the modified content back to the file
-            # FIXED: Use heredoc for safe writing (handles large files, Unicode, no length limit)
-            temp_file = f"/tmp/swe_replace_{abs(hash(file_path))}.tmp"
-            
-            # Write to temp file using heredoc (most reliable method)
-            write_cmd = f"cat > {shlex.quote(temp_file)} << 'EDIT_EOF'\n{new_content}\nEDIT_EOF"
-            self.env.execute(write_cmd)
-            
-            # Verify temp file was written correctly (catch corruption early)
-            verify_cmd = f"wc -l {shlex.quote(temp_file)}"
-            verify_output = self.env.execute(verify_cmd)
-            if isinstance(verify_output, dict):
-                verify_output = verify_output.get("output", str(verify_output))
-            
-            temp_line_count = int(verify_output.strip().split()[0])
-            expected_line_count = len(new_lines)
-            
-            if temp_line_count == 0 and expected_line_count > 0:
-                raise ValueError(f"Temp file is empty! Expected {expected_line_count} lines. Write failed!")
-            
-            # Atomic move (preserves permissions, safer than direct write)
-            self.env.execute(f"mv {shlex.quote(temp_file)} {shlex.quote(file_path)}")
-            
-            # Final verification to catch any corruption
-            verify_final_cmd = f"wc -l {shlex.quote(file_path)}"
-            verify_final = self.env.execute(verify_final_cmd)
-            if isinstance(verify_final, dict):
-                verify_final = verify_final.get("output", str(verify_final))
-            
-            final_line_count = int(verify_final.strip().split()[0])
-            
-            if final_line_count == 0 and expected_line_count > 0:
-                # Emergency: file corrupted, restore from git
-                raise ValueError(
-                    f"CRITICAL: File is empty after write! Expected {expected_line_count} lines.\n"
-                    f"Attempting to restore from git..."
-                )
-                try:
-                    self.env.execute(f"git checkout -- {shlex.quote(file_path)}")
-                except:
-                    pass  # If restore fails, at least we raised the error
-            
+            # Read only the edited span for validation (sed range addressing)
+            # instead of cat-ing the whole file across the exec channel
+            old_content = self.env.execute(
+                f"sed -n '{from_line},{to_line}p' {shlex.quote(file_path)}"
+            )
+            if old_content.endswith("\n"):
+                old_content = old_content[:-1]
+
+            # Check for catastrophic deletions before touching the file
+            _validate_edit_safety(file_path, from_line, to_line, old_content, content)
+
+            # One in-environment fork splices the replacement into the file and
+            # writes it back atomically (tempfile in the target dir, fsync,
+            # os.replace). The file bytes never leave the container, replacing
+            # the old cat + heredoc + wc + mv + wc sequence of five round-trips
+            # each moving O(file size) over the exec channel.
+            py_script = f"""
+import os, sys, tempfile
+path = {file_path!r}
+from_line = {from_line}
+to_line = {to_line}
+content = {content!r}
+with open(path, 'r', encoding='utf-8') as f:
+    lines = f.read().split('\\n')
+if to_line > len(lines):
+    print(f"ERROR: to_line {to_line} exceeds file length {{len(lines)}}")
+    sys.exit(1)
+new_lines = lines[:from_line - 1] + content.split('\\n') + lines[to_line:]
+fd, tmp = tempfile.mkstemp(prefix='swe_replace_', dir=os.path.dirname(path) or '.')
+try:
+    with os.fdopen(fd, 'wb') as out:
+        out.write('\\n'.join(new_lines).encode('utf-8'))
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, path)
+except Exception:
+    try:
+        os.unlink(tmp)
+    except OSError:
+        pass
+    raise
+print("REPLACED_OK", len(new_lines))
+"""
+            # The exec backend reports failure only through the output text
+            # (exit codes are not surfaced), so require the success sentinel
+            # before claiming the edit landed or invalidating caches
+            result = self.env.execute(f"python3 -c {shlex.quote(py_script)}")
+            if "REPLACED_OK" not in result:
+                raise ValueError(f"In-environment edit failed: {result.strip() or 'no output'}")
+            self._edit_epoch += 1  # invalidate read-only caches
+
+            final_line_count = result.strip().split()[-1]
             return f"Successfully replaced lines {from_line}-{to_line} in {file_path} ({final_line_count} lines total)"
         except Exception as e:
             raise ValueError(f"Error replacing content in file: {str(e)}")
@@ -194,36 +321,34 @@ class SWEEnvironment:
         """
         try:
             output = self.env.execute(f"cat {file_path}")
-            # Handle dict return type from minisweagent
-            if isinstance(output, dict):
-                output = output.get("output", str(output))
             return output
         except Exception as e:
             raise ValueError(f"Error reading file: {str(e)}")
 
     def search_in_file(self, file_path: str, pattern: str) -> str:
         """Search for a pattern in a file and return the matching lines."""
-        # FIXED: Use shlex.quote to prevent shell injection
-        return self.run_bash_cmd(f"grep {shlex.quote(pattern)} {shlex.quote(file_path)}")
+        # argv form: no shell parsing and no quoting concerns
+        return self._exec_argv(["grep", pattern, file_path])
 
     def list_functions(self, file_path: str) -> str:
         """List function and class definitions in a Python file."""
-        return self.run_bash_cmd(f"grep -E '^\\s*(def|class)\\s+' {file_path}")
+        return self._exec_argv(["grep", "-E", r"^\s*(def|class)\s+", file_path])
 
     def search_codebase(self, pattern: str) -> str:
         """Search for a pattern recursively in the codebase."""
         # FIXED: Use shlex.quote to prevent shell injection
-        return self.run_bash_cmd(f"grep -r {shlex.quote(pattern)} .")
+        # (read-only: env.execute keeps the edit epoch untouched)
+        return self.env.execute(f"grep -r {shlex.quote(pattern)} .")
 
     def run_tests(self, test_path: str = "") -> str:
         """
         Run tests using pytest. If test_path is provided, runs specific tests.
         Otherwise, runs all tests.
         """
-        cmd = "python -m pytest -xvs"
+        argv = ["python", "-m", "pytest", "-xvs"]
         if test_path:
-            cmd += f" {test_path}"
-        return self.run_bash_cmd(cmd)
+            argv.append(test_path)
+        return self._exec_argv(argv)
 
     def search_and_replace(self, file_path: str, old_text: str, new_text: str) -> str:
         """
@@ -231,7 +356,7 @@ class SWEEnvironment:
         FIXED: Uses Python for reliability (handles all special characters correctly).
         """
         # VALIDATION: Prevent modifying test files
-        if '/test' in file_path or file_path.startswith('test'):
+        if _is_test_path(file_path):
             raise ValueError(
                 f"⛔ BLOCKED: Cannot modify test file '{file_path}'!\n"
                 f"Test files define the requirements - they should NOT be changed.\n"
@@ -277,7 +402,22 @@ except Exception as e:
 
     def check_python_syntax(self, file_path: str) -> str:
         """Check the syntax of a Python file."""
-        return self.run_bash_cmd(f"python -m py_compile {file_path}")
+        # compile() runs inside the environment: the target files live in the
+        # container (cwd /testbed), so a host-side open() would check the
+        # wrong tree. Plain compile still skips py_compile's bytecode write.
+        py_script = (
+            "import sys\n"
+            f"path = {file_path!r}\n"
+            "try:\n"
+            "    compile(open(path, 'rb').read(), path, 'exec')\n"
+            "except Exception as e:\n"
+            "    print(f'{type(e).__name__}: {e}')\n"
+            "    sys.exit(1)\n"
+        )
+        output = self._exec_argv(["python3", "-c", py_script])
+        if output.strip():
+            raise ValueError(output.strip())
+        return ""
     
     def show_lines_with_numbers(self, file_path: str, from_line: int, to_line: int) -> str:
         """
@@ -293,38 +433,64 @@ except Exception as e:
             Lines with numbers and indentation markers
         """
         try:
-            # Use sed to extract the lines and nl to add line numbers
-            output = self.run_bash_cmd(f"sed -n '{from_line},{to_line}p' {file_path} | cat -A")
-            # cat -A shows tabs as ^I and line ends as $, making indentation visible
-            
-            # Also show a cleaner version with line numbers
-            clean_output = self.run_bash_cmd(f"sed -n '{from_line},{to_line}p' {file_path} | nl -ba -v {from_line}")
-            
+            # Extract the range once; both views are formatted in-memory so we
+            # pay for a single subprocess instead of two sed pipelines
+            # (read-only: env.execute keeps the edit epoch untouched)
+            raw = self.env.execute(f"sed -n '{from_line},{to_line}p' {shlex.quote(file_path)}")
+            lines = raw.split('\n')
+            if lines and lines[-1] == '':
+                lines.pop()  # drop the trailing empty piece from sed's final newline
+
+            clean_output = '\n'.join(
+                f"{n:6d}\t{ln}" for n, ln in enumerate(lines, start=from_line)
+            )
+            # Mimic cat -A: tabs as ^I, line ends as $, making indentation visible
+            output = '\n'.join(f"{ln.replace(chr(9), '^I')}$" for ln in lines)
+
             return f"Lines {from_line}-{to_line} from {file_path}:\n\n{clean_output}\n\n(With indentation markers - spaces are normal, ^I means tab, $ means line end):\n{output}"
         except Exception as e:
             raise ValueError(f"Error reading lines from file: {str(e)}")
     
     # -------------------- ENHANCED TOOLS (V7) --------------------
     
+    def show_file_bytes(self, file_path: str, max_lines: int = 500) -> bytes:
+        """
+        Show file contents with line numbers, returned as raw bytes.
+
+        Skips the str decode/re-encode round-trip when the caller ships the
+        output straight into a prompt (the tokenizer works on utf-8 anyway).
+
+        Args:
+            file_path: Path to file to display
+            max_lines: Maximum number of lines to show (default 500)
+
+        Returns:
+            Numbered file contents as utf-8 bytes
+        """
+        try:
+            output = self.env.execute(f"nl -ba {shlex.quote(file_path)} | head -n {max_lines}")
+            # env.execute already decoded once; avoid any further str passes
+            return output if isinstance(output, bytes) else output.encode("utf-8")
+        except Exception as e:
+            raise ValueError(f"Error showing file '{file_path}': {str(e)}")
+
     def show_file(self, file_path: str, max_lines: int = 500) -> str:
         """
         Show file contents with line numbers (easier than using cat -n or nl).
-        
+
         Args:
             file_path: Path to file to display
             max_lines: Maximum number of lines to show (default 500, prevents huge outputs)
-        
+
         Returns:
             File contents with line numbers
         """
         try:
-            # Read file and add line numbers
-            output = self.run_bash_cmd(f"nl -ba {shlex.quote(file_path)} | head -n {max_lines}")
-            
+            # Thin str wrapper over the bytes variant (single decode)
+            output = self.show_file_bytes(file_path, max_lines).decode("utf-8", errors="replace")
+
             # Check if file was truncated
-            line_count_output = self.run_bash_cmd(f"wc -l {shlex.quote(file_path)}")
-            if isinstance(line_count_output, dict):
-                line_count_output = line_count_output.get("output", str(line_count_output))
+            line_count_output = self.env.execute(f"wc -l {shlex.quote(file_path)}")
             
             total_lines = int(line_count_output.strip().split()[0])
             
@@ -356,12 +522,12 @@ except Exception as e:
             if start_line > end_line:
                 raise ValueError(f"start_line ({start_line}) must be <= end_line ({end_line})")
             
-            # Use sed to extract lines, then nl to add line numbers
-            output = self.run_bash_cmd(
+            # Use sed to extract lines, then nl to add line numbers.
+            # Return the numbered output as-is: callers concatenate it straight
+            # into the prompt, so the extra header re-join is wasted copying.
+            return self.env.execute(
                 f"sed -n '{start_line},{end_line}p' {shlex.quote(file_path)} | nl -ba -v {start_line}"
             )
-            
-            return f"Lines {start_line}-{end_line} from {file_path}:\n\n{output}"
         except Exception as e:
             raise ValueError(f"Error reading lines {start_line}-{end_line} from '{file_path}': {str(e)}")
     
@@ -379,20 +545,25 @@ except Exception as e:
             # Check if it's a Python file
             if not file_path.endswith('.py'):
                 return f"⚠️ Warning: {file_path} is not a .py file, skipping syntax check"
-            
-            # Try to compile the file
-            result = self.run_bash_cmd(f"python -m py_compile {shlex.quote(file_path)} 2>&1")
-            
-            # If no output, it succeeded
-            if not result.strip():
-                return f"✓ Syntax OK: {file_path}"
-            
-            # Check if it's just a success message
-            if "Compiling" in result or result.strip() == "":
+
+            # compile() runs inside the environment: the target files live in
+            # the container (cwd /testbed), so a host-side open() would check
+            # the wrong tree. Plain compile skips py_compile's bytecode write.
+            py_script = (
+                "path = " + repr(file_path) + "\n"
+                "try:\n"
+                "    compile(open(path, 'rb').read(), path, 'exec')\n"
+                "    print('SYNTAX_OK')\n"
+                "except Exception as e:\n"
+                "    print(f'{type(e).__name__}: {e}')\n"
+            )
+            result = self.env.execute(f"python3 -c {shlex.quote(py_script)} 2>&1")
+
+            if "SYNTAX_OK" in result:
                 return f"✓ Syntax OK: {file_path}"
-            
-            # Otherwise it's probably an error
-            return f"✗ Syntax Error in {file_path}:\n{result}"
+
+            # Otherwise it's the error message printed by the script
+            return f"✗ Syntax Error in {file_path}:\n{result.strip()}"
             
         except Exception as e:
             # Extract syntax error details
@@ -416,36 +587,57 @@ except Exception as e:
         """
         try:
             # Validation: Prevent modifying test files
-            if '/test' in file_path or file_path.startswith('test'):
+            if _is_test_path(file_path):
                 raise ValueError(
                     f"⛔ BLOCKED: Cannot modify test file '{file_path}'!\n"
                     f"Test files define the requirements - they should NOT be changed."
                 )
             
             after_line = int(after_line)
-            
+
+            # Fail fast on bad input before forking anything in the container
+            if after_line < 0:
+                raise ValueError("after_line must be >= 0")
+
             # Read current file
             read_output = self.run_bash_cmd(f"cat {shlex.quote(file_path)}")
-            if isinstance(read_output, dict):
-                read_output = read_output.get("output", str(read_output))
-            lines = read_output.split('\n')
-            
-            # Validate line number
-            if after_line < 0 or after_line > len(lines):
-                raise ValueError(f"after_line must be between 0 and {len(lines)}")
-            
-            # Insert content
-            content_lines = content.split('\n')
-            new_lines = lines[:after_line] + content_lines + lines[after_line:]
-            new_content = '\n'.join(new_lines)
+
+            # Splice at the byte level via the newline-offset array instead of
+            # splitting the whole file into a list of line strings and
+            # rebuilding it (three list allocations + join over the file)
+            data = read_output.encode("utf-8")
+            offsets = _newline_offsets(data)
+            num_lines = len(offsets) + 1
+
+            # Validate upper bound (needs the file length, so after the read)
+            if after_line > num_lines:
+                raise ValueError(f"after_line must be between 0 and {num_lines}")
+
+            # Byte position right after line `after_line` (0 = start of file)
+            pos = 0 if after_line == 0 else (
+                offsets[after_line - 1] + 1 if after_line - 1 < len(offsets) else len(data)
+            )
+            insert_bytes = content.encode("utf-8")
+            if pos == len(data) and data and not data.endswith(b"\n"):
+                # Appending to a file without a trailing newline: open a new line
+                insert_bytes = b"\n" + insert_bytes
+            else:
+                insert_bytes = insert_bytes + b"\n"
+            new_content = (data[:pos] + insert_bytes + data[pos:]).decode("utf-8")
             
-            # Write back
-            temp_file = f"/tmp/swe_insert_{abs(hash(file_path))}.tmp"
-            write_cmd = f"cat > {shlex.quote(temp_file)} << 'INSERT_EOF'\n{new_content}\nINSERT_EOF"
+            # Write back via a mktemp-allocated path: unique per call, so
+            # concurrent workers editing different (or same) files can never
+            # collide, unlike names derived from hash(file_path)
+            temp_file = self.run_bash_cmd("mktemp /tmp/swe_insert_XXXXXX").strip()
+            # Per-call heredoc delimiter: a fixed token would silently truncate
+            # the write if the content itself ever contained that line
+            eof = f"INSERT_EOF_{uuid.uuid4().hex}"
+            write_cmd = f"cat > {shlex.quote(temp_file)} << '{eof}'\n{new_content}\n{eof}"
             self.run_bash_cmd(write_cmd)
             self.run_bash_cmd(f"mv {shlex.quote(temp_file)} {shlex.quote(file_path)}")
+            self._edit_epoch += 1  # invalidate read-only caches
             
-            num_lines_inserted = len(content_lines)
+            num_lines_inserted = content.count('\n') + 1
             return f"✓ Inserted {num_lines_inserted} line(s) after line {after_line} in {file_path}"
             
         except Exception as e:
@@ -479,21 +671,40 @@ except Exception as e:
             if not all_keywords:
                 results.append("No obvious test keywords found in description.")
                 results.append("Trying generic test file search...")
-            
-            # Search for test files containing these keywords
-            for keyword in all_keywords[:5]:  # Limit to first 5 to avoid spam
+
+            # Search for test files containing these keywords with ONE directory
+            # walk shared across all keywords (rg -e pat1 -e pat2 ...), instead
+            # of a find|xargs grep traversal per keyword
+            keywords = all_keywords[:5]  # Limit to first 5 to avoid spam
+            if keywords:
+                pattern_args = " ".join(f"-e {shlex.quote(k)}" for k in keywords)
+                alternation = shlex.quote("|".join(re.escape(k) for k in keywords))
                 try:
-                    cmd = f"find . -name '*.py' -path '*/test*' | xargs grep -l '{keyword}' 2>/dev/null | head -5"
-                    output = self.run_bash_cmd(cmd)
-                    if output.strip():
-                        results.append(f"Tests mentioning '{keyword}':\n{output}")
+                    cmd = (
+                        f"rg -l -t py -g '*test*' {pattern_args} 2>/dev/null"
+                        f" || find . -name '*.py' -path '*/test*' | xargs grep -lE {alternation} 2>/dev/null"
+                    )
+                    output = self.env.execute(f"{{ {cmd}; }} | head -20")
                 except:
-                    pass
+                    output = ""
+                matched_files = output.split()
+                if matched_files:
+                    # Cheap second pass: group per keyword over the matched files only
+                    file_args = " ".join(shlex.quote(f) for f in matched_files)
+                    for keyword in keywords:
+                        try:
+                            hits = self.env.execute(
+                                f"grep -l {shlex.quote(keyword)} {file_args} 2>/dev/null | head -5"
+                            )
+                            if hits.strip():
+                                results.append(f"Tests mentioning '{keyword}':\n{hits}")
+                        except:
+                            pass
             
             if not results:
                 # Fallback: list test directories
                 try:
-                    test_dirs = self.run_bash_cmd("find . -type d -name '*test*' | head -10")
+                    test_dirs = self.env.execute("find . -type d -name '*test*' | head -10")
                     results.append(f"Test directories in project:\n{test_dirs}")
                 except:
                     pass
@@ -516,36 +727,150 @@ except Exception as e:
             Comprehensive findings about the topic
         """
         try:
-            steps = [
-                (f"grep -rn 'class.*{topic}' --include='*.py' 2>/dev/null | head -10", "Class definitions"),
-                (f"grep -rn 'def.*{topic}' --include='*.py' 2>/dev/null | head -10", "Function definitions"),
-                (f"grep -rn 'import.*{topic}' --include='*.py' 2>/dev/null | head -10", "Import statements"),
-                (f"find . -name '*{topic.lower()}*.py' 2>/dev/null | head -10", "Related files"),
-                (f"find . -name '*test*.py' | xargs grep -l '{topic}' 2>/dev/null | head -5", "Test files"),
-            ]
-            
+            # One cached directory walk per episode (see _py_files); the greps
+            # below consume the materialized listing instead of re-walking
+            py_files = self._py_files()
+
+            if py_files:
+                grep_src = "xargs -a /tmp/swe_pyfiles.txt"
+                steps = [
+                    (f"{grep_src} grep -n 'class.*{topic}' 2>/dev/null | head -10", "Class definitions"),
+                    (f"{grep_src} grep -n 'def.*{topic}' 2>/dev/null | head -10", "Function definitions"),
+                    (f"{grep_src} grep -n 'import.*{topic}' 2>/dev/null | head -10", "Import statements"),
+                ]
+            else:
+                # Cache unavailable: fall back to full-tree greps
+                steps = [
+                    (f"grep -rn 'class.*{topic}' --include='*.py' 2>/dev/null | head -10", "Class definitions"),
+                    (f"grep -rn 'def.*{topic}' --include='*.py' 2>/dev/null | head -10", "Function definitions"),
+                    (f"grep -rn 'import.*{topic}' --include='*.py' 2>/dev/null | head -10", "Import statements"),
+                ]
+
             results = [f"=== Deep exploration of '{topic}' ===\n"]
-            
+
             for cmd, description in steps:
                 try:
-                    output = self.run_bash_cmd(cmd)
+                    output = self.env.execute(cmd)
                     if output.strip():
                         results.append(f"\n--- {description} ---")
                         results.append(output)
                 except:
                     results.append(f"\n--- {description} ---")
                     results.append("(No results)")
-            
+
+            # Related/test files come straight from the cached listing (no shell)
+            related = [f for f in py_files if topic.lower() in f.lower()][:10]
+            if related:
+                results.append("\n--- Related files ---")
+                results.append("\n".join(related))
+
+            test_candidates = [f for f in py_files if 'test' in f.lower()][:200]
+            if test_candidates:
+                try:
+                    file_args = " ".join(shlex.quote(f) for f in test_candidates)
+                    hits = self.env.execute(
+                        f"grep -l '{topic}' {file_args} 2>/dev/null | head -5"
+                    )
+                    if hits.strip():
+                        results.append("\n--- Test files ---")
+                        results.append(hits)
+                except:
+                    pass
+
             return "\n".join(results)
             
         except Exception as e:
             return f"Error exploring codebase: {str(e)}"
 
+class PersistentBashPool:
+    """
+    Pool of long-lived bash processes that amortizes fork+exec across many
+    small commands (FastCGI-style). Each command's stdout/stderr are redirected
+    to per-worker temp files; completion is detected via a sentinel line with
+    the exit status on the worker shell's own stdout.
+    """
+
+    def __init__(self, size: int = 4):
+        self._workers = queue.Queue()
+        for _ in range(size):
+            self._workers.put(self._spawn())
+
+    def _spawn(self) -> dict:
+        return {
+            "proc": subprocess.Popen(
+                ["bash"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                bufsize=1,
+            ),
+            "out": tempfile.NamedTemporaryFile(prefix="swe_pool_out_", delete=False).name,
+            "err": tempfile.NamedTemporaryFile(prefix="swe_pool_err_", delete=False).name,
+        }
+
+    def run(self, command: str) -> tuple:
+        """Run command in a pooled shell; returns (returncode, stdout, stderr)."""
+        worker = self._workers.get()
+        try:
+            if worker["proc"].poll() is not None:
+                # Worker shell died (e.g. the command called exit); respawn
+                worker = self._spawn()
+            proc = worker["proc"]
+            sentinel = f"__SWE_DONE_{uuid.uuid4().hex}__"
+            # ( ... ) subshell, not a { ... } group: cd, exported variables,
+            # and set options die with the fork instead of leaking into later
+            # commands on this worker, matching the per-command isolation of
+            # a fresh bash -c while keeping the long-lived shell's startup
+            # amortization.
+            # </dev/null: a command that reads stdin (cat, patch, a REPL)
+            # would otherwise swallow the sentinel printf from the shared
+            # stdin pipe and hang the sentinel loop below forever
+            proc.stdin.write(
+                "(\n" + command + "\n)"
+                + f" < /dev/null > {shlex.quote(worker['out'])} 2> {shlex.quote(worker['err'])}\n"
+                + f"printf '%s %s\\n' {sentinel} $?\n"
+            )
+            proc.stdin.flush()
+            for line in proc.stdout:
+                if line.startswith(sentinel):
+                    returncode = int(line.split()[1])
+                    break
+            else:
+                raise ValueError("Pooled shell exited while running the command")
+            with open(worker["out"]) as f:
+                out = f.read()
+            with open(worker["err"]) as f:
+                err = f.read()
+            return returncode, out, err
+        finally:
+            self._workers.put(worker)
+
+    def close(self) -> None:
+        while not self._workers.empty():
+            worker = self._workers.get_nowait()
+            try:
+                worker["proc"].stdin.close()
+                worker["proc"].terminate()
+            except Exception:
+                pass
+            for key in ("out", "err"):
+                try:
+                    os.unlink(worker[key])
+                except OSError:
+                    pass
+
+
 class DumbEnvironment:
     """
     Dumb environment that just executes the command
     """
 
+    # Shared pre-warmed shells: repeated execute() calls reuse a live bash
+    # instead of paying fork+exec+shell startup per command
+    _pool = None
+    _pool_lock = threading.Lock()
+
     def execute(self, command: str) -> str:
         """
         Run the command in bash and return the output
@@ -556,9 +881,17 @@ class DumbEnvironment:
         Returns:
             The output of running the shell command
         """
-        result = subprocess.run(command, capture_output=True, shell=True, check=False)
-        output = f"--STDOUT--\n{result.stdout.decode()}\n--STDERR--\n{result.stderr.decode()}"
-        if result.returncode:
+        if DumbEnvironment._pool is None:
+            # Double-checked locking: concurrent first calls must not each
+            # spawn (and leak) a pool; cleanup is registered once here
+            with DumbEnvironment._pool_lock:
+                if DumbEnvironment._pool is None:
+                    pool = PersistentBashPool()
+                    atexit.register(pool.close)
+                    DumbEnvironment._pool = pool
+        returncode, stdout, stderr = DumbEnvironment._pool.run(command)
+        output = f"--STDOUT--\n{stdout}\n--STDERR--\n{stderr}"
+        if returncode:
             raise ValueError(output)
         return output
     
@@ -591,14 +924,21 @@ class MinimalSWEEnvironment:
     """
 
     def __init__(self, instance: dict):
-        self.env = get_sb_environment(instance)
+        self.env = _StrEnv(get_sb_environment(instance))
+        # Monotonic counter bumped on every successful edit; cached search
+        # results are keyed on it so any edit invalidates them wholesale
+        self._edit_epoch = 0
+        self._sym_cache: dict = {}
 
     def run_bash_cmd(self, command: str, description: str = "") -> str:
         """Run a shell command and return its output (stderr included on failure)."""
+        # Arbitrary agent shell can edit files (sed -i, heredocs, git apply),
+        # so treat every call to this tool as a potential edit and invalidate
+        # the epoch-keyed symbol cache. Internal read-only helpers (show_file)
+        # go through self.env.execute directly so they cannot flush it.
+        self._edit_epoch += 1
         try:
             output = self.env.execute(command)
-            if isinstance(output, dict):
-                output = output.get("output", str(output))
             return output
         except subprocess.TimeoutExpired as e:
             output = e.output.decode("utf-8", errors="replace") if e.output else ""
@@ -609,7 +949,9 @@ class MinimalSWEEnvironment:
     def show_file(self, file_path: str) -> str:
         """Show file contents with line numbers."""
         try:
-            return self.run_bash_cmd(f"nl -ba {shlex.quote(file_path)}")
+            # env.execute, not run_bash_cmd: a read-only view must not bump
+            # the edit epoch and flush the symbol cache
+            return self.env.execute(f"nl -ba {shlex.quote(file_path)}")
         except Exception as e:
             raise ValueError(f"Error showing file '{file_path}': {str(e)}")
 
@@ -628,8 +970,6 @@ class MinimalSWEEnvironment:
             scope = f" {test_path}" if test_path else ""
             # Always succeed and capture output even if pytest is missing
             output = self.env.execute(f"python -m pytest -q{scope} 2>&1 || true")
-            if isinstance(output, dict):
-                output = output.get("output", str(output))
             if "No module named pytest" not in output:
                 return output
             # Fallback: project-local runner
@@ -638,8 +978,6 @@ class MinimalSWEEnvironment:
                 "elif [ -f runtests.py ]; then python runtests.py -q 2>&1 || true; "
                 "else echo 'pytest_unavailable_and_no_runner'; fi"
             )
-            if isinstance(fallback, dict):
-                fallback = fallback.get("output", str(fallback))
             return fallback
         except Exception as e:
             return f"Error running tests: {e}"
@@ -651,8 +989,6 @@ class MinimalSWEEnvironment:
         """
         try:
             output = self.env.execute("pytest -q --last-failed 2>&1 || true")
-            if isinstance(output, dict):
-                output = output.get("output", str(output))
             return output
         except Exception as e:
             return f"Error running last failed tests: {e}"
@@ -688,13 +1024,14 @@ class MinimalSWEEnvironment:
         Returns matching test file paths (limited).
         """
         try:
+            # Prefer ripgrep (single walk, literal matching); fall back to the
+            # find|xargs grep pipeline only when rg is unavailable or empty
             cmd = (
-                f"find tests -type f -name '*test*.py' 2>/dev/null | xargs grep -n "
-                f"{shlex.quote(symbol)} 2>/dev/null | head -50"
+                f"{{ rg -nF -g '*test*.py' {shlex.quote(symbol)} tests 2>/dev/null"
+                f" || find tests -type f -name '*test*.py' 2>/dev/null | xargs grep -n "
+                f"{shlex.quote(symbol)} 2>/dev/null; }} | head -50"
             )
             output = self.env.execute(cmd)
-            if isinstance(output, dict):
-                output = output.get("output", str(output))
             return output if output.strip() else f"No tests reference '{symbol}'."
         except Exception as e:
             return f"Error suggesting related tests: {e}"
@@ -702,7 +1039,7 @@ class MinimalSWEEnvironment:
     def replace_in_file(self, file_path: str, from_line: int, to_line: int, content: str) -> str:
         """Safely replace lines [from_line, to_line] with content (multiline supported)."""
         # Prevent modifying tests
-        if '/test' in file_path or file_path.startswith('test'):
+        if _is_test_path(file_path):
             raise ValueError(
                 f"⛔ BLOCKED: Cannot modify test file '{file_path}'!\n"
                 f"Fix the implementation instead."
@@ -715,47 +1052,72 @@ class MinimalSWEEnvironment:
         if from_line > to_line:
             raise ValueError("from_line must be <= to_line")
 
-        # Read entire file
-        read_output = self.env.execute(f"cat {file_path}")
-        if isinstance(read_output, dict):
-            read_output = read_output.get("output", str(read_output))
-        lines = read_output.split('\n')
-        if to_line > len(lines):
-            raise ValueError(f"to_line {to_line} exceeds file length {len(lines)}")
+        # sed silently truncates a span past EOF, which would run the safety
+        # check below against the wrong old content — validate the range
+        # against the real line count first
+        wc_out = self.env.execute(f"wc -l < {shlex.quote(file_path)}").strip()
+        try:
+            newline_count = int(wc_out.split()[0])
+        except (ValueError, IndexError):
+            raise ValueError(f"Cannot read {file_path}: {wc_out}")
+        # split('\n') in the splice script yields newline_count+1 entries
+        if to_line > newline_count + 1:
+            raise ValueError(f"to_line {to_line} exceeds file length {newline_count + 1}")
+
+        # Read only the edited span for validation (small transfer) instead of
+        # cat-ing the whole file across the exec channel
+        old_content = self.env.execute(
+            f"sed -n '{from_line},{to_line}p' {shlex.quote(file_path)}"
+        )
+        if old_content.endswith('\n'):
+            old_content = old_content[:-1]
 
         # Validate we are not deleting function/class definitions accidentally
-        old_content = '\n'.join(lines[from_line - 1:to_line])
-        try:
-            from agent import validate_edit_safety
-            validate_edit_safety(file_path, from_line, to_line, old_content, content)
-        except Exception as e:
-            raise
+        _validate_edit_safety(file_path, from_line, to_line, old_content, content)
 
         # No-op/duplicate edit guard: avoid proceeding if replacement is identical
-        if content.split('\n') == lines[from_line - 1:to_line]:
+        if content == old_content:
             raise ValueError(
                 "No-op edit: replacement content is identical to existing lines."
             )
 
-        new_lines = lines[:from_line - 1] + content.split('\n') + lines[to_line:]
-        new_content = '\n'.join(new_lines)
-
-        # Atomic write via heredoc to temp file
-        temp_file = f"/tmp/swe_replace_{abs(hash(file_path))}.tmp"
-        write_cmd = f"cat > {shlex.quote(temp_file)} << 'EDIT_EOF'\n{new_content}\nEDIT_EOF"
-        self.env.execute(write_cmd)
-        self.env.execute(f"mv {shlex.quote(temp_file)} {shlex.quote(file_path)}")
-        # Post-write verification: confirm file actually changed
-        try:
-            after = self.env.execute(f"sed -n '{from_line},{to_line}p' {shlex.quote(file_path)}")
-            if isinstance(after, dict):
-                after = after.get("output", str(after))
-            if after.strip() == old_content.strip():
-                raise ValueError("Edit appears to have had no effect (content unchanged).")
-        except Exception:
-            # If verification fails silently, still return success message
-            # so the agent can inspect with git diff
-            pass
+        # One in-environment fork does the read/splice/atomic-write (tempfile in
+        # the target directory, fsync, os.replace) instead of the previous
+        # cat + heredoc + mv + sed sequence of four shell round-trips
+        py_script = f"""
+import os, sys, tempfile
+path = {file_path!r}
+from_line = {from_line}
+to_line = {to_line}
+content = {content!r}
+with open(path, 'r', encoding='utf-8') as f:
+    lines = f.read().split('\\n')
+if to_line > len(lines):
+    print(f"ERROR: to_line {to_line} exceeds file length {{len(lines)}}")
+    sys.exit(1)
+new_content = '\\n'.join(lines[:from_line - 1] + content.split('\\n') + lines[to_line:])
+fd, tmp = tempfile.mkstemp(prefix='swe_replace_', dir=os.path.dirname(path) or '.')
+try:
+    with os.fdopen(fd, 'wb') as out:
+        out.write(new_content.encode('utf-8'))
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, path)
+except Exception:
+    try:
+        os.unlink(tmp)
+    except OSError:
+        pass
+    raise
+print("REPLACED_OK")
+"""
+        # The exec backend reports failure only through the output text (exit
+        # codes are not surfaced), so require the success sentinel before
+        # claiming the edit landed or invalidating caches
+        result = self.env.execute(f"python3 -c {shlex.quote(py_script)}")
+        if "REPLACED_OK" not in result:
+            raise ValueError(f"In-environment edit failed: {result.strip() or 'no output'}")
+        self._edit_epoch += 1  # invalidate cached search results
         return f"Replaced lines {from_line}-{to_line} in {file_path}"
 
     # (removed) run_tests
@@ -773,13 +1135,13 @@ class MinimalSWEEnvironment:
         """
         try:
             scope = shlex.quote(path) if path else ""
-            status = self.env.execute("git status --porcelain")
-            if isinstance(status, dict):
-                status = status.get("output", str(status))
-            diff = self.env.execute(f"git --no-pager diff --unified=0 {scope}")
-            if isinstance(diff, dict):
-                diff = diff.get("output", str(diff))
-            return f"STATUS:\n{status}\n\nDIFF (u=0):\n{diff}"
+            # Status and diff in one shell call, split on a sentinel line
+            output = self.env.execute(
+                f"{GIT} status --porcelain; printf '\\n===GIT_SUMMARY===\\n'; "
+                f"{GIT} --no-pager diff --unified=0 {scope}"
+            )
+            status, _, diff = output.partition("===GIT_SUMMARY===")
+            return f"STATUS:\n{status.rstrip()}\n\nDIFF (u=0):\n{diff.lstrip()}"
         except Exception as e:
             return f"Error getting git diff summary: {e}"
 
@@ -788,38 +1150,76 @@ class MinimalSWEEnvironment:
 
         Returns matching lines (limited) or a clear 'not found' message.
         """
+        # The agent frequently re-asks about the same symbol within one
+        # trajectory; memoize per (symbol, path, edit epoch) so repeats skip
+        # the grep fork entirely and edits invalidate the whole cache
+        cache_key = (symbol, search_path, self._edit_epoch)
+        cached = self._sym_cache.get(cache_key)
+        if cached is not None:
+            return cached
         try:
             base = search_path if search_path else "."
+            # Scope to Python sources via pathspec globs; -F avoids regex
+            # backtracking and --untracked covers files the agent just created
+            if search_path:
+                specs = f"':(glob){search_path}/**/*.py' ':(glob){search_path}/**/*.pyx'"
+            else:
+                specs = "':(glob)**/*.py' ':(glob)**/*.pyx'"
             cmd = (
-                f"git grep -n {{sym}} -- {shlex.quote(base)} 2>/dev/null | head -50"
+                f"{{ {GIT} grep --no-color -n --untracked -F {shlex.quote(symbol)} -- {specs} 2>/dev/null"
+                f" || rg --fixed-strings --no-heading -n -t py {shlex.quote(symbol)} {shlex.quote(base)} 2>/dev/null; }}"
+                " | head -50"
             )
-            # Use parameter expansion safely
-            output = self.env.execute(cmd.format(sym=shlex.quote(symbol)))
-            if isinstance(output, dict):
-                output = output.get("output", str(output))
-            return output if output.strip() else f"No occurrences of '{symbol}' found under {base}."
+            output = self.env.execute(cmd)
+            result = output if output.strip() else f"No occurrences of '{symbol}' found under {base}."
+            if len(self._sym_cache) >= 1024:
+                # Drop the oldest entry (insertion order) to stay bounded
+                self._sym_cache.pop(next(iter(self._sym_cache)))
+            self._sym_cache[cache_key] = result
+            return result
         except Exception as e:
             return f"Error searching for symbol: {e}"
 
     def generate_patch(self, result: str) -> str:
         """Generate a git diff patch for submission."""
         try:
-            status = self.env.execute("git status --porcelain")
-            if isinstance(status, dict):
-                status = status.get("output", str(status))
-            if not status.strip():
+            # "Any changes?" probe; status --porcelain also lists staged-only
+            # entries (the agent runs git add itself via run_bash_cmd), which
+            # ls-files -m -o cannot see
+            changed = self.env.execute(f"{GIT} status --porcelain | head -n1")
+            if not changed.strip():
                 return f"{result}\n\nWARNING: No file changes detected by git."
-            self.env.execute("git add -A")
-            patch_output = self.env.execute("git diff --cached")
-            if isinstance(patch_output, dict):
-                patch_output = patch_output.get("output", str(patch_output))
-            if patch_output.strip():
-                return patch_output
-            unstaged_patch = self.env.execute("git diff HEAD")
-            if isinstance(unstaged_patch, dict):
-                unstaged_patch = unstaged_patch.get("output", str(unstaged_patch))
+            # Exit-code emptiness probe first; only serialize the diff if
+            # something is actually staged
+            probe = self.env.execute(f"{GIT} add -A && {GIT} diff --cached --quiet; echo $?")
+            if not probe.strip().endswith("0"):
+                patch_output = self.env.execute(f"{GIT} diff --cached --no-color --no-ext-diff")
+                if patch_output.strip():
+                    return patch_output
+            unstaged_patch = self.env.execute(f"{GIT} diff HEAD --no-color --no-ext-diff")
             if unstaged_patch.strip():
                 return unstaged_patch
             return f"{result}\n\nNo changes detected to generate a patch."
         except Exception as e:
-            return f"{result}\n\nError running git commands: {e}"
\ No newline at end of file
+            return f"{result}\n\nError running git commands: {e}"
+
+# Read-only tools. The agent may serve a repeated identical call straight from
+# its result cache until the next side-effecting tool runs (see ReactAgent's
+# _ro_cache); tagging here keeps the knowledge next to the tool definitions.
+for _tool in (
+    SWEEnvironment.show_file,
+    SWEEnvironment.show_lines_with_numbers,
+    SWEEnvironment.read_specific_lines,
+    SWEEnvironment.search_in_file,
+    SWEEnvironment.list_functions,
+    SWEEnvironment.search_codebase,
+    SWEEnvironment.check_python_syntax,
+    SWEEnvironment.check_syntax,
+    SWEEnvironment.git_diff_summary,
+    MinimalSWEEnvironment.show_file,
+    MinimalSWEEnvironment.suggest_related_tests,
+    MinimalSWEEnvironment.symbol_exists,
+    MinimalSWEEnvironment.git_diff_summary,
+):
+    _tool.side_effect_free = True
+del _tool
@@ -1,4 +1,8 @@
 from abc import ABC, abstractmethod
+import hashlib
+import json
+import threading
+import httpx
 import openai
 import os
 from dotenv import load_dotenv
@@ -6,6 +10,62 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+# One OpenAI client (and thus one httpx connection pool) shared by every
+# OpenAIModel in the process. Constructing a client per instance meant a
+# fresh pool and fresh TLS handshakes per worker; sharing reuses keep-alive
+# connections across instances. Created lazily so importing llm.py stays
+# cheap and key-less tooling (e.g. compile checks) never builds a client.
+_CLIENT = None
+_ASYNC_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=200, max_keepalive_connections=100)
+
+
+def _get_client() -> openai.OpenAI:
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = openai.OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    max_retries=2,
+                    timeout=60.0,
+                    http_client=httpx.Client(limits=_http_limits()),
+                )
+    return _CLIENT
+
+
+def _get_async_client() -> openai.AsyncOpenAI:
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None:
+        with _CLIENT_LOCK:
+            if _ASYNC_CLIENT is None:
+                _ASYNC_CLIENT = openai.AsyncOpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    max_retries=2,
+                    timeout=60.0,
+                    http_client=httpx.AsyncClient(limits=_http_limits()),
+                )
+    return _ASYNC_CLIENT
+
+# Bounded in-memory response cache shared by all OpenAIModel instances.
+# Agent steps frequently retry with byte-identical prompts (same system block,
+# tool registry and early turns); a hit skips the whole API round-trip.
+_RESPONSE_CACHE: dict = {}
+_RESPONSE_CACHE_LOCK = threading.Lock()
+_RESPONSE_CACHE_MAX = 4096
+
+
+def _cache_key(model_name: str, reasoning_effort: str | None, prompt) -> str:
+    # prompt may be a flat string or a structured messages list; repr() is a
+    # stable serialization for the latter
+    text = prompt if isinstance(prompt, str) else repr(prompt)
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+    return f"{model_name}|{reasoning_effort}|{digest}"
+
 
 class LLM(ABC):
     """Abstract base class for Large Language Models."""
@@ -26,18 +86,133 @@ class OpenAIModel(LLM):
     Implements the class to call OpenAI's backend (e.g., OpenAI GPT-5 mini)
     and return the model's text output. Ensures the model produces the response
     format required by ResponseParser and includes the stop token in the output string.
+
+    Prompts may be flat strings or structured role/content message lists; the
+    Responses API accepts both, and the structured form keeps the transcript
+    prefix stable across steps so the provider can reuse its prompt/KV cache.
     """
 
+    # Callers may pass a messages list instead of a flat prompt string
+    accepts_messages = True
+
     def __init__(self, stop_token: str, model_name: str = "gpt-5-mini", reasoning_effort: str | None = "medium"):
-        # Initialize OpenAI client
-        self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # All instances share the module-level client/connection pool
+        self.client = _get_client()
         self.stop_token = stop_token
         self.model_name = model_name
         self.reasoning_effort = reasoning_effort
 
-    def generate(self, prompt: str) -> str:
+    def _stream_until_stop(self, prompt: str | list) -> str:
+        """
+        Stream output deltas and close the stream as soon as the stop token
+        (the END_CALL marker) shows up, cancelling the remaining server-side
+        generation. Returns the accumulated text, or "" if nothing arrived.
+        """
+        parts = []
+        tail = ""
+        with self.client.responses.stream(
+            model=self.model_name,
+            input=prompt,
+            reasoning={"effort": self.reasoning_effort or "medium"},
+        ) as stream:
+            for event in stream:
+                if getattr(event, "type", "") != "response.output_text.delta":
+                    continue
+                delta = getattr(event, "delta", "") or ""
+                parts.append(delta)
+                if self.stop_token:
+                    # Keep just enough tail to catch a marker split across deltas
+                    tail = (tail + delta)[-2 * len(self.stop_token):]
+                    if self.stop_token in tail:
+                        stream.close()
+                        break
+        return "".join(parts)
+
+    def stream(self, prompt: str | list, no_cache: bool = False):
+        """
+        Yield output-text deltas as they arrive, letting the caller stop
+        generation itself (e.g. on the parser's END_CALL marker): closing the
+        iterator tears down the HTTP stream and cancels the remaining
+        server-side generation. A cached full response is replayed as one
+        chunk; whatever accumulated when the iterator finishes or is closed
+        gets cached for next time (the tail past the marker is discarded by
+        the parser anyway). Retry paths pass no_cache=True to force a fresh
+        sample instead of replaying the completion that already failed.
+        """
+        key = _cache_key(self.model_name, self.reasoning_effort, prompt)
+        if not no_cache:
+            with _RESPONSE_CACHE_LOCK:
+                cached = _RESPONSE_CACHE.get(key)
+            if cached is not None:
+                yield cached
+                return
+        parts = []
+
+        def _save():
+            text = "".join(parts)
+            if not text:
+                return
+            if self.stop_token and not text.endswith(self.stop_token):
+                text += self.stop_token
+            with _RESPONSE_CACHE_LOCK:
+                if len(_RESPONSE_CACHE) >= _RESPONSE_CACHE_MAX:
+                    _RESPONSE_CACHE.pop(next(iter(_RESPONSE_CACHE)))
+                _RESPONSE_CACHE[key] = text
+
+        try:
+            with self.client.responses.stream(
+                model=self.model_name,
+                input=prompt,
+                reasoning={"effort": self.reasoning_effort or "medium"},
+            ) as stream:
+                for event in stream:
+                    if getattr(event, "type", "") != "response.output_text.delta":
+                        continue
+                    delta = getattr(event, "delta", "") or ""
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+        except GeneratorExit:
+            # Caller closed at the marker: the truncation is deliberate and
+            # the text is complete for the parser's purposes, so cache it
+            _save()
+            raise
+        # Anything else (HTTP error mid-generation) propagates WITHOUT
+        # caching — a truncated body with the stop token appended would look
+        # complete and poison retries of the same prompt
+        _save()
+
+    def generate(self, prompt: str | list, no_cache: bool = False) -> str:
+        # Memoize by prompt hash; retry paths pass no_cache=True so they don't
+        # get the same failing completion back
+        key = _cache_key(self.model_name, self.reasoning_effort, prompt)
+        if not no_cache:
+            with _RESPONSE_CACHE_LOCK:
+                cached = _RESPONSE_CACHE.get(key)
+            if cached is not None:
+                return cached
+
         # Call the model (Responses API) with explicit reasoning effort
         try:
+            # Prefer streaming: everything after the function-call end marker is
+            # discarded by the parser anyway, so stop generation as soon as the
+            # marker arrives instead of paying for the tail tokens
+            generated_text = None
+            try:
+                generated_text = self._stream_until_stop(prompt)
+            except Exception:
+                generated_text = None
+
+            if generated_text:
+                if self.stop_token and not generated_text.endswith(self.stop_token):
+                    generated_text += self.stop_token
+                with _RESPONSE_CACHE_LOCK:
+                    if len(_RESPONSE_CACHE) >= _RESPONSE_CACHE_MAX:
+                        _RESPONSE_CACHE.pop(next(iter(_RESPONSE_CACHE)))
+                    _RESPONSE_CACHE[key] = generated_text
+                return generated_text
+
+            # Fallback: blocking call
             response = self.client.responses.create(
                 model=self.model_name,
                 input=prompt,
@@ -63,6 +238,141 @@ class OpenAIModel(LLM):
             if self.stop_token and not generated_text.endswith(self.stop_token):
                 generated_text += self.stop_token
 
+            with _RESPONSE_CACHE_LOCK:
+                if len(_RESPONSE_CACHE) >= _RESPONSE_CACHE_MAX:
+                    # Drop the oldest entry (insertion order) to stay bounded
+                    _RESPONSE_CACHE.pop(next(iter(_RESPONSE_CACHE)))
+                _RESPONSE_CACHE[key] = generated_text
+
+            return generated_text
+
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate response from OpenAI: {str(e)}")
+
+    def generate_tool_calls(self, prompt: str | list, tools: list) -> tuple:
+        """
+        Structured tool-call path: let the provider emit JSON tool calls
+        directly instead of the textual marker protocol, skipping the parser,
+        normalization, and the format-error retry round-trip entirely.
+
+        Returns (text, calls) where calls is a list of dicts shaped exactly
+        like ResponseParser output ({"thought", "name", "arguments"}), so the
+        agent loop is agnostic to which path produced them. Opt-in only: the
+        assignment's text protocol stays the default.
+        """
+        try:
+            response = self.client.responses.create(
+                model=self.model_name,
+                input=prompt,
+                tools=tools,
+                reasoning={"effort": self.reasoning_effort or "medium"},
+            )
+            text = getattr(response, "output_text", "") or ""
+            calls = []
+            for item in getattr(response, "output", []) or []:
+                if getattr(item, "type", "") != "function_call":
+                    continue
+                try:
+                    arguments = json.loads(getattr(item, "arguments", "") or "{}")
+                except ValueError:
+                    arguments = {}
+                calls.append({
+                    "thought": text if not calls else "",
+                    "name": getattr(item, "name", ""),
+                    "arguments": arguments,
+                })
+            return text, calls
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate tool calls from OpenAI: {str(e)}")
+
+    async def agenerate(self, prompt: str | list, no_cache: bool = False) -> str:
+        """
+        Async twin of generate() for event-loop drivers: awaits the shared
+        AsyncOpenAI client so one loop can multiplex many in-flight calls
+        instead of parking an OS thread per request. Shares the response cache.
+        """
+        key = _cache_key(self.model_name, self.reasoning_effort, prompt)
+        if not no_cache:
+            with _RESPONSE_CACHE_LOCK:
+                cached = _RESPONSE_CACHE.get(key)
+            if cached is not None:
+                return cached
+
+        try:
+            response = await _get_async_client().responses.create(
+                model=self.model_name,
+                input=prompt,
+                reasoning={"effort": self.reasoning_effort or "medium"},
+            )
+
+            generated_text = getattr(response, "output_text", None)
+            if not generated_text:
+                try:
+                    parts = []
+                    for item in getattr(response, "output", []) or []:
+                        for seg in getattr(item, "content", []) or []:
+                            text = getattr(seg, "text", None)
+                            if text:
+                                parts.append(text)
+                    generated_text = "".join(parts) if parts else str(response)
+                except Exception:
+                    generated_text = str(response)
+
+            if self.stop_token and not generated_text.endswith(self.stop_token):
+                generated_text += self.stop_token
+
+            with _RESPONSE_CACHE_LOCK:
+                if len(_RESPONSE_CACHE) >= _RESPONSE_CACHE_MAX:
+                    _RESPONSE_CACHE.pop(next(iter(_RESPONSE_CACHE)))
+                _RESPONSE_CACHE[key] = generated_text
+
+            return generated_text
+
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate response from OpenAI: {str(e)}")
+
+
+class AsyncOpenAIModel(LLM):
+    """
+    Async variant of OpenAIModel backed by openai.AsyncOpenAI.
+
+    Hundreds of in-flight requests can share one event loop instead of
+    blocking an OS thread each; use from async drivers only.
+    """
+
+    def __init__(self, stop_token: str, model_name: str = "gpt-5-mini", reasoning_effort: str | None = "medium"):
+        self.client = _get_async_client()
+        self.stop_token = stop_token
+        self.model_name = model_name
+        self.reasoning_effort = reasoning_effort
+
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError("AsyncOpenAIModel is async-only; use agenerate()")
+
+    async def agenerate(self, prompt: str) -> str:
+        try:
+            response = await self.client.responses.create(
+                model=self.model_name,
+                input=prompt,
+                reasoning={"effort": self.reasoning_effort or "medium"},
+            )
+
+            generated_text = getattr(response, "output_text", None)
+            if not generated_text:
+                try:
+                    parts = []
+                    for item in getattr(response, "output", []) or []:
+                        for seg in getattr(item, "content", []) or []:
+                            text = getattr(seg, "text", None)
+                            if text:
+                                parts.append(text)
+                    generated_text = "".join(parts) if parts else str(response)
+                except Exception:
+                    generated_text = str(response)
+
+            if self.stop_token and not generated_text.endswith(self.stop_token):
+                generated_text += self.stop_token
+
             return generated_text
 
         except Exception as e:
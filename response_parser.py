@@ -36,6 +36,17 @@ ls -la
 {END_CALL}
 """
 
+    def __init__(self):
+        # Bind the class-constant markers (and their lengths) to the instance
+        # once, so parse() does plain LOAD_FAST work instead of repeated
+        # attribute resolution and len() calls per response
+        self._begin = self.BEGIN_CALL
+        self._end = self.END_CALL
+        self._sep = self.ARG_SEP
+        self._begin_len = len(self._begin)
+        self._end_len = len(self._end)
+        self._sep_len = len(self._sep)
+
     def parse(self, text: str) -> dict:
         """
         Parse the function call from `text` using string.rfind to avoid confusion with
@@ -43,51 +54,99 @@ ls -la
 
         Returns a dictionary: {"thought": str, "name": str, "arguments": dict}
         """
+        rfind = text.rfind
+
         # Find the last occurrence of END_CALL
-        end_pos = text.rfind(self.END_CALL)
+        end_pos = rfind(self._end)
         if end_pos == -1:
-            raise ValueError(f"Missing {self.END_CALL} marker in response")
-        
+            raise ValueError(f"Missing {self._end} marker in response")
+
         # Find the last occurrence of BEGIN_CALL before END_CALL
-        begin_pos = text.rfind(self.BEGIN_CALL, 0, end_pos)
+        begin_pos = rfind(self._begin, 0, end_pos)
         if begin_pos == -1:
-            raise ValueError(f"Missing {self.BEGIN_CALL} marker in response")
-        
+            raise ValueError(f"Missing {self._begin} marker in response")
+
         # Extract the thought (everything before BEGIN_CALL)
         thought = text[:begin_pos].strip()
-        
-        # Extract the function call body (between BEGIN_CALL and END_CALL)
-        call_start = begin_pos + len(self.BEGIN_CALL)
-        call_body = text[call_start:end_pos].strip()
-        
-        # Split by ARG_SEP to get function name and arguments
-        parts = call_body.split(self.ARG_SEP)
-        
-        if len(parts) < 1:
-            raise ValueError("Function call body is empty")
-        
-        # First part is the function name
-        function_name = parts[0].strip()
+
+        return self._parse_block(text, begin_pos, end_pos, thought)
+
+    def parse_all(self, text: str) -> list:
+        """
+        Parse the trailing run of consecutive BEGIN/END function-call blocks.
+
+        Lets the LLM emit several independent tool calls in one response so
+        the agent can execute them locally and answer with a single follow-up
+        message instead of paying one round-trip per call. Like parse(), this
+        anchors on rfind: only blocks at the END of the response count, and an
+        earlier block is accepted only when nothing but whitespace separates
+        it from the next one. A marker block quoted inside the thought (the
+        system prompt itself ships an example call) is therefore never
+        executed. Returns a list of {"thought", "name", "arguments"} dicts;
+        "thought" is only populated for the first block. Raises ValueError
+        when no complete block exists.
+        """
+        rfind = text.rfind
+        end_pos = rfind(self._end)
+        blocks: list = []
+        while end_pos != -1:
+            begin_pos = rfind(self._begin, 0, end_pos)
+            if begin_pos == -1:
+                break
+            blocks.append((begin_pos, end_pos))
+            prev_end = rfind(self._end, 0, begin_pos)
+            if prev_end == -1:
+                break
+            # Anything other than whitespace between the previous block's END
+            # and this block's BEGIN means the previous block is part of the
+            # thought (e.g. a quoted example), not a call to execute
+            if text[prev_end + self._end_len:begin_pos].strip():
+                break
+            end_pos = prev_end
+        if not blocks:
+            # Defer to the single-call path so the error messages match
+            return [self.parse(text)]
+        blocks.reverse()
+        return [
+            self._parse_block(text, b, e, text[:b].strip() if i == 0 else "")
+            for i, (b, e) in enumerate(blocks)
+        ]
+
+    def _parse_block(self, text: str, begin_pos: int, end_pos: int, thought: str) -> dict:
+        find = text.find
+        sep = self._sep
+        sep_len = self._sep_len
+
+        # Single forward scan over the call body: locate each ARG_SEP with
+        # str.find and slice blocks directly, instead of materializing a list
+        # of substrings via split() for every response
+        call_start = begin_pos + self._begin_len
+        sep_pos = find(sep, call_start, end_pos)
+
+        # First slice (up to the first ARG_SEP, or END_CALL) is the function name
+        function_name = text[call_start:sep_pos if sep_pos != -1 else end_pos].strip()
         if not function_name:
             raise ValueError("Function name is empty")
-        
-        # Parse arguments (pairs of name and value)
+
+        # Each remaining slice is one argument block: name on the first line,
+        # value (possibly multiline) on the rest
         arguments = {}
-        # Arguments come in pairs after the function name
-        for i in range(1, len(parts)):
-            arg_block = parts[i].strip()
-            if not arg_block:
-                continue
-            
-            # Split into name and value (first line is name, rest is value)
-            lines = arg_block.split('\n', 1)
-            arg_name = lines[0].strip()
-            # Only strip trailing whitespace from value to preserve leading indentation
-            arg_value = lines[1].rstrip() if len(lines) > 1 else ""
-            
-            if arg_name:
-                arguments[arg_name] = arg_value
-        
+        while sep_pos != -1:
+            block_start = sep_pos + sep_len
+            next_sep = find(sep, block_start, end_pos)
+            block = text[block_start:next_sep if next_sep != -1 else end_pos].strip()
+            if block:
+                newline = block.find('\n')
+                if newline == -1:
+                    arg_name, arg_value = block, ""
+                else:
+                    arg_name = block[:newline].strip()
+                    # Only strip trailing whitespace from value to preserve leading indentation
+                    arg_value = block[newline + 1:].rstrip()
+                if arg_name:
+                    arguments[arg_name] = arg_value
+            sep_pos = next_sep
+
         return {
             "thought": thought,
             "name": function_name,
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
+import asyncio
 import concurrent.futures
+import os
 from pathlib import Path
 
 import typer
@@ -13,11 +15,32 @@ DATASET_MAPPING = {
     "cs294": "lynnliu030/swebench-eval-subset",
 }
 
+# Cap on instances processed concurrently (adjust based on your CPU/RAM)
+MAX_CONCURRENT_INSTANCES = 20
+
+
+def _worker_init() -> None:
+    """Pre-import heavy modules once per worker process.
+
+    Moves the import cost (openai/httpx, datasets, the agent stack) out of the
+    first process_instance call in each worker.
+    """
+    import openai  # noqa: F401
+    import datasets  # noqa: F401
+    import simple_agent  # noqa: F401
+
 from simple_agent import ReactAgent
 from llm import OpenAIModel
 from response_parser import ResponseParser
 from envs import MinimalSWEEnvironment
 
+# Shared per process: the parser is stateless across instances, and models
+# (hence OpenAI clients) are reused per model name instead of rebuilt for
+# every instance a worker handles
+_PARSER = ResponseParser()
+_LLM_CACHE: dict = {}
+
+
 def process_instance(
     instance: dict,
     output_dir: Path,
@@ -33,9 +56,9 @@ def process_instance(
     remove_from_preds_file(output_dir / "preds.json", instance_id)
     (instance_dir / f"{instance_id}.traj.json").unlink(missing_ok=True)
     
-    # Initialize the model and parser
-    llm = OpenAIModel(ResponseParser.END_CALL, model_name)
-    parser = ResponseParser()
+    # Reuse the model (and its HTTP client) and the shared stateless parser
+    llm = _LLM_CACHE.setdefault(model_name, OpenAIModel(ResponseParser.END_CALL, model_name))
+    parser = _PARSER
     task = instance["problem_statement"]
     
     print(f"Processing instance {instance_id}")
@@ -93,8 +116,10 @@ def process_instance(
                 )
                 # Backtrack to the user message (id=1) with new instructions
                 agent.add_instructions_and_backtrack(retry_instructions, 1)
-                # Shorter second pass
-                output_retry = agent.run(task, max_steps // 2)
+                # Shorter second pass; bypass the LLM response cache — after
+                # the backtrack the contexts are byte-identical to the first
+                # pass, and a cached replay would just repeat the failed run
+                output_retry = agent.run(task, max_steps // 2, no_cache=True)
                 result = env.generate_patch(output_retry)
             except Exception as _:
                 # Keep original result if retry fails
@@ -118,9 +143,11 @@ def process_instance(
 def main(
     subset: str = typer.Option("cs294", "--subset", help="SWEBench subset used or path to a dataset", rich_help_panel="Data selection"),
     split: str = typer.Option("test", "--split", help="Dataset split", rich_help_panel="Data selection"),
+    instance_ids: str = typer.Option("", "--instance-ids", help="Comma-separated instance ids to run (default: all)", rich_help_panel="Data selection"),
     output: str = typer.Option("outputs", "-o", "--output", help="Output directory", rich_help_panel="Basic"),
     model_name: str = typer.Option("gpt-5-mini", "--model", help="Model used", rich_help_panel="Basic"),
     max_steps: int = typer.Option(100, "--max-steps", help="Maximum number of steps", rich_help_panel="Basic"),
+    workers: int = typer.Option(0, "--workers", help="Concurrent instance workers (0 = auto-size)", rich_help_panel="Basic"),
     baseline: bool = typer.Option(False, "--baseline", help="Use bash-only baseline agent", rich_help_panel="Basic"),
     # NOTE: provide any extra arguments if needed
 ) -> None:
@@ -130,36 +157,60 @@ def main(
 
     dataset_path = DATASET_MAPPING.get(subset, subset)
     print(f"Loading dataset {dataset_path}, split {split}...")
-    instances = list(load_dataset(dataset_path, split=split))
+    dataset = load_dataset(dataset_path, split=split)
+    if instance_ids:
+        # Index once and look targets up by key (O(1) per id) instead of
+        # scanning the whole dataset per requested instance
+        target_ids = [t.strip() for t in instance_ids.split(",") if t.strip()]
+        by_id = {inst["instance_id"]: inst for inst in dataset}
+        missing = [t for t in target_ids if t not in by_id]
+        if missing:
+            print(f"Warning: instance ids not in dataset: {missing}")
+        instances = [by_id[t] for t in target_ids if t in by_id]
+    else:
+        instances = list(dataset)
     print(f"Running on {len(instances)} instances...")
 
-    def process_futures(futures: dict[concurrent.futures.Future, str]):
-        for future in concurrent.futures.as_completed(futures):
-            try:
-                future.result()
-            except concurrent.futures.CancelledError:
-                pass
-            except Exception as e:
-                instance_id = futures[future]
-                print(f"Error in future for instance {instance_id}: {e}")
-
-    # Increase parallelism for faster benchmarking (adjust based on your CPU/RAM)
-    # 20 workers = ~2x speedup, 30 workers = ~3x speedup (if you have resources)
-    with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-        futures = {
-            executor.submit(process_instance, instance, output_path, model_name, max_steps, baseline): instance[
-                "instance_id"
-            ]
-            for instance in instances
-        }
-        try:
-            process_futures(futures)
-        except KeyboardInterrupt:
-            print("Cancelling all pending jobs. Press ^C again to exit immediately.")
-            for future in futures:
-                if not future.running() and not future.done():
-                    future.cancel()
-            process_futures(futures)
+    if workers <= 0:
+        # Auto-size: mostly-I/O workloads tolerate ~2x cores, but never more
+        # workers than instances and never more than the hard cap
+        workers = min(len(instances) or 1, (os.cpu_count() or 4) * 2, MAX_CONCURRENT_INSTANCES)
+    print(f"Using {workers} workers")
+
+    # One event loop drives all instances, but each instance body runs in a
+    # worker *process* (own interpreter, own GIL, own sockets): the CPU-bound
+    # parts of a run — context assembly, regex/inspect work, YAML dumps, git
+    # subprocess handling — no longer serialize against each other the way
+    # they did under a thread pool. Only picklable primitives cross the
+    # process boundary; agent/env objects (and each instance's Docker
+    # container handle) are built inside the worker.
+    async def run_one(
+        semaphore: asyncio.Semaphore,
+        loop: asyncio.AbstractEventLoop,
+        pool: concurrent.futures.ProcessPoolExecutor,
+        instance: dict,
+    ) -> None:
+        async with semaphore:
+            await loop.run_in_executor(
+                pool, process_instance, dict(instance), output_path, model_name, max_steps, baseline
+            )
+
+    async def run_all() -> None:
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(workers)
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_worker_init
+        ) as pool:
+            tasks = [run_one(semaphore, loop, pool, instance) for instance in instances]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        for instance, res in zip(instances, results):
+            if isinstance(res, Exception):
+                print(f"Error in task for instance {instance['instance_id']}: {res}")
+
+    try:
+        asyncio.run(run_all())
+    except KeyboardInterrupt:
+        print("Cancelled pending jobs.")
 
 
 if __name__ == "__main__":
@@ -1,15 +1,58 @@
 from __future__ import annotations
 
 from typing import Dict, Callable, Any, List
-from datetime import datetime
+from collections import deque
+from array import array
+import asyncio
 import inspect
+import os
+import time
 import yaml
 import subprocess
 import re
 
+try:
+    # libyaml-backed dumper is 5-10x faster on multi-KB trajectory contents
+    from yaml import CSafeDumper as _YamlDumper
+except ImportError:
+    from yaml import SafeDumper as _YamlDumper
+
 from response_parser import ResponseParser
 from llm import LLM
 
+# Compiled once; _normalize_response runs on every assistant message and a
+# string-pattern re.sub pays a cache lookup per call
+_END_CALL_DEDUP_RE = re.compile(r"(----END_FUNCTION_CALL----)+")
+
+# Lines consisting solely of the stray END_ARGUMENT marker (plus whitespace);
+# used by _sanitize_arg to strip them in one regex pass
+# [ \t]* (not \s*): \s matches newlines, which would swallow surrounding
+# blank lines and the next line's indentation — fatal for code arguments
+_END_ARG_LINE_RE = re.compile(r"(?m)^[ \t]*----END_ARGUMENT----[ \t]*\n?")
+
+# Rendered tool descriptions shared across agent instances. inspect.signature
+# and getdoc re-parse source every call, and bound methods hash differently
+# per instance, so the memo keys on (module, qualname) rather than the
+# function object itself.
+_TOOL_DESC_CACHE: Dict[tuple, str] = {}
+
+# Single-entry TTL memo for the finish() git probe: models stuck in an error
+# loop can hammer finish several times a second, and the repo state only
+# changes when the index does. Keyed on (cwd, .git/index mtime).
+_GIT_PROBE_CACHE: Dict[tuple, tuple] = {}
+_GIT_PROBE_TTL = 1.0
+
+
+def _tool_desc(tool: Callable[..., Any]) -> str:
+    key = (getattr(tool, "__module__", ""), getattr(tool, "__qualname__", tool.__name__))
+    desc = _TOOL_DESC_CACHE.get(key)
+    if desc is None:
+        signature = inspect.signature(tool)
+        docstring = inspect.getdoc(tool) or ""
+        desc = f"Function: {tool.__name__}{signature}\n{docstring}\n"
+        _TOOL_DESC_CACHE[key] = desc
+    return desc
+
 
 class ReactAgent:
     """
@@ -20,23 +63,64 @@ class ReactAgent:
     - Registers a small set of tools provided externally
     """
 
-    def __init__(self, name: str, parser: ResponseParser, llm: LLM):
+    def __init__(self, name: str, parser: ResponseParser, llm: LLM, use_native_tools: bool = False):
         self.name: str = name
         self.parser = parser
         self.llm = llm
+        # Opt-in: let the provider return structured JSON tool calls instead
+        # of the textual marker protocol (requires an LLM exposing
+        # generate_tool_calls). Default off — the text protocol is the
+        # assignment's required interface.
+        self.use_native_tools: bool = use_native_tools
 
         # Required attributes
-        self.timestamp: int = int(datetime.utcnow().timestamp())
-        self.id_to_message: List[Dict[str, Any]] = []
+        self.timestamp: int = int(time.time())
+        # Per-step timestamp reused for every message created in that step;
+        # int(time.time()) once per iteration instead of a datetime allocation
+        # plus conversion per message
+        self._step_ts: int = self.timestamp
+        # Message store is struct-of-arrays: parallel columns instead of one
+        # dict per message. Appends touch five flat lists (parents are a
+        # contiguous int array, so the parent walk stays in cache) and the
+        # dict view is materialized only for serialization (id_to_message).
+        self._roles: List[str] = []
+        self._contents: List[str] = []
+        self._msg_timestamps: List[int] = []
+        self._parents = array("i")
+        self._children: List[List[int]] = []
         self.root_message_id: int = -1
         self.current_message_id: int = -1
         self.function_map: Dict[str, Callable[..., Any]] = {}
+        # Rendered once per registry change; the unknown-tool error path fires
+        # during exactly the misbehaving-model streaks that dominate long runs
+        self._tool_names_str: str = "[]"
 
         # Internal state
         self._tests_unavailable: bool = False
         self._instructions: str = ""
         self._last_tool_name: str = ""
         self._last_tool_error_streak: int = 0
+        # Rolling window of recent (tool, args) hashes; catches the model
+        # re-issuing an identical call that succeeds but makes no progress,
+        # which the error-streak detector above cannot see
+        self._recent_call_hashes: deque = deque(maxlen=6)
+        # Results of side_effect_free tools keyed (tool, args); flushed as
+        # soon as any side-effecting tool runs
+        self._ro_cache: Dict = {}
+        # Rendered tool descriptions, invalidated whenever tools change;
+        # inspect.signature/getdoc are slow and the registry rarely mutates
+        self._tools_block_cache: str | None = None
+        # OpenAI tool specs for the native path, invalidated with the block
+        self._native_specs_cache: List[Dict[str, Any]] | None = None
+        # Visible root->current path and its rendered parts, maintained
+        # incrementally: appends extend both in O(1); backtracks and in-place
+        # content edits (both rare) trigger a full rebuild
+        self._visible_path: List[int] = []
+        self._transcript_parts: List[str] = []
+        # Per-message rendered form ("[role]\ncontent\n"), computed exactly
+        # once at append time; rebuilds after a backtrack re-join these cached
+        # strings instead of re-running the f-string per message
+        self._rendered: List[str] = []
 
         # Minimal but strong system guidance for SWE-bench-style fixes
         self._system_prompt = (
@@ -65,7 +149,9 @@ class ReactAgent:
             "- Docs/parsers: treat new warnings as failures and inspect output for 'WARNING'.\n"
             "- Masked test failures. Prefer explicit 'PASSED' checks or inspecting exit codes/output.\n\n"
             "RESPONSE RULE:\n"
-            "Every response MUST end with exactly one function call using the required format.\n"
+            "Every response MUST end with at least one function call using the required format.\n"
+            "You MAY emit up to 3 independent function calls per response when their inputs do not\n"
+            "depend on each other; they execute in order and all results return in one message.\n"
         )
 
         # Register built-in finish tool
@@ -78,88 +164,190 @@ class ReactAgent:
     # ---------------------------- Messaging ----------------------------
     def _add_message(self, role: str, content: str) -> int:
         parent_id = self.current_message_id
-        msg_id = len(self.id_to_message)
-        msg = {
-            "role": role,
-            "content": content,
-            "timestamp": int(datetime.utcnow().timestamp()),
-            "unique_id": msg_id,
-            "parent": parent_id,
-            "children": [],
-        }
-        self.id_to_message.append(msg)
+        msg_id = len(self._roles)
+        self._roles.append(role)
+        self._contents.append(content)
+        self._msg_timestamps.append(self._step_ts)
+        self._parents.append(parent_id)
+        self._children.append([])
         if parent_id != -1:
-            self.id_to_message[parent_id]["children"].append(msg_id)
+            self._children[parent_id].append(msg_id)
         self.current_message_id = msg_id
         if self.root_message_id == -1:
             self.root_message_id = msg_id
+        # New messages always extend the current branch (parent is the old
+        # cursor), so the visible path and transcript grow by one part
+        self._visible_path.append(msg_id)
+        rendered = f"[{role}]\n{content}\n"
+        self._rendered.append(rendered)
+        if not (msg_id == self.root_message_id and role == "system"):
+            self._transcript_parts.append(rendered)
         return msg_id
 
     def _set_message(self, idx: int, content: str) -> None:
-        self.id_to_message[idx]["content"] = content
+        self._contents[idx] = content
+        self._rendered[idx] = f"[{self._roles[idx]}]\n{content}\n"
+        # In-place edits (user prompt fill-in) invalidate the visible parts
+        self._rebuild_transcript()
 
-    def _build_context(self) -> str:
-        # Compose a minimal system block with available tools and the parser format
-        tool_descriptions: List[str] = []
-        for tool in self.function_map.values():
-            signature = inspect.signature(tool)
-            docstring = inspect.getdoc(tool) or ""
-            tool_descriptions.append(
-                f"Function: {tool.__name__}{signature}\n{docstring}\n"
-            )
-        tools_block = "\n".join(tool_descriptions)
-
-        system_block = (
+    @property
+    def id_to_message(self) -> List[Dict[str, Any]]:
+        """Dict-per-message view over the columnar store.
+
+        Materialized on demand for serialization (save_traj/save_history);
+        the hot paths read the columns directly.
+        """
+        return [
+            {
+                "role": self._roles[i],
+                "content": self._contents[i],
+                "timestamp": self._msg_timestamps[i],
+                "unique_id": i,
+                "parent": self._parents[i],
+                "children": self._children[i],
+            }
+            for i in range(len(self._roles))
+        ]
+
+    def _rebuild_transcript(self) -> None:
+        """Recompute the visible path and its rendered parts from parent links.
+
+        Only needed after a cursor move (backtrack) or an in-place content
+        change; ordinary appends keep both structures current incrementally.
+        """
+        path: List[int] = []
+        cursor = self.current_message_id
+        parents = self._parents
+        while cursor != -1:
+            path.append(cursor)
+            cursor = parents[cursor]
+        path.reverse()
+        self._visible_path = path
+        # Parts were rendered once at append time; a rebuild only re-selects
+        rendered = self._rendered
+        self._transcript_parts = [
+            rendered[mid]
+            for mid in path
+            if not (mid == self.root_message_id and self._roles[mid] == "system")
+        ]
+
+    def _system_block(self) -> str:
+        # Compose a minimal system block with available tools and the parser format.
+        # The rendered tool descriptions are cached: inspect.signature/getdoc
+        # re-parse sources every call, and nothing changes between steps.
+        tools_block = self._tools_block_cache
+        if tools_block is None:
+            # Per-tool descriptions come from the module-level memo, so even
+            # a rebuild after add_functions skips the inspect work for tools
+            # already rendered by any agent in this process
+            tools_block = "\n".join(_tool_desc(tool) for tool in self.function_map.values())
+            self._tools_block_cache = tools_block
+
+        return (
             f"{self._system_prompt}\n\n"
             f"--- AVAILABLE TOOLS ---\n{tools_block}\n\n"
             f"--- RESPONSE FORMAT ---\n{self.parser.response_format}\n"
         )
 
-        # Walk from root to current using parent links to build the visible path
-        visible_ids: List[int] = []
-        cursor = self.current_message_id
-        while cursor != -1:
-            visible_ids.append(cursor)
-            cursor = self.id_to_message[cursor]["parent"]
-        visible_ids.reverse()
-
-        transcript_parts: List[str] = [f"[system]\n{system_block}\n"]
-        for mid in visible_ids:
-            msg = self.id_to_message[mid]
-            # Skip only the root system message (we already inject dynamic system block)
-            if msg["role"] == "system" and mid == self.root_message_id:
-                continue
-            transcript_parts.append(f"[{msg['role']}]\n{msg['content']}\n")
+    def _build_context(self) -> str:
+        # The visible path is maintained incrementally by _add_message (and
+        # rebuilt on backtrack), so context assembly is one join per step
+        # instead of an O(N) parent walk plus re-render
+        return "\n".join([f"[system]\n{self._system_block()}\n"] + self._transcript_parts)
 
-        return "\n".join(transcript_parts)
+    def _build_messages(self) -> List[Dict[str, str]]:
+        """Structured role/content messages for backends that accept them.
+
+        Keeping the transcript as discrete messages (stable prefix, only the
+        tail grows) lets the provider reuse its server-side prompt/KV cache
+        across steps, which one re-serialized flat string defeats.
+        """
+        messages: List[Dict[str, str]] = [{"role": "system", "content": self._system_block()}]
+        for mid in self._visible_path:
+            # Skip only the root system message (replaced by the dynamic block)
+            if mid == self.root_message_id and self._roles[mid] == "system":
+                continue
+            messages.append({"role": self._roles[mid], "content": self._contents[mid]})
+        return messages
 
     # ---------------------------- Tools ----------------------------
     def add_functions(self, tools: List[Callable[..., Any]]) -> None:
         for tool in tools:
             self.function_map[tool.__name__] = tool
+        self._tools_block_cache = None  # registry changed; re-render lazily
+        self._native_specs_cache = None
+        self._tool_names_str = repr(list(self.function_map))
+
+    def _native_tool_specs(self) -> List[Dict[str, Any]]:
+        """OpenAI tool specs derived from the registry.
+
+        Schemas come from inspect.signature plus type annotations; cached like
+        the textual tools block and only built when use_native_tools is on.
+        """
+        if self._native_specs_cache is not None:
+            return self._native_specs_cache
+        type_map = {str: "string", int: "integer", float: "number", bool: "boolean"}
+        specs: List[Dict[str, Any]] = []
+        for name, tool in self.function_map.items():
+            properties: Dict[str, Any] = {}
+            required: List[str] = []
+            try:
+                params = inspect.signature(tool).parameters
+            except (TypeError, ValueError):
+                params = {}
+            for pname, param in params.items():
+                if pname == "self":
+                    continue
+                properties[pname] = {"type": type_map.get(param.annotation, "string")}
+                if param.default is inspect.Parameter.empty:
+                    required.append(pname)
+            specs.append({
+                "type": "function",
+                "name": name,
+                "description": (inspect.getdoc(tool) or "").strip(),
+                "parameters": {"type": "object", "properties": properties, "required": required},
+            })
+        self._native_specs_cache = specs
+        return specs
 
     def finish(self, result: str) -> str:
         """
         Submit final result/summary. The runner will generate a git patch after
         this is returned. Keep the summary concise (what changed and why).
         """
-        # Guard: only allow finish when there are code changes
+        # Guard: only allow finish when there are code changes.
+        # One fork covers status + both diffs (split on a sentinel line)
+        # instead of three serialized subprocess.run calls; repeated finish
+        # attempts within the TTL reuse the previous probe output.
         try:
-            status = subprocess.run(
-                ["git", "status", "--porcelain"], capture_output=True, text=True, timeout=5
-            )
-            if status.returncode == 0 and not status.stdout.strip():
-                raise ValueError(
-                    "no_changes: No file modifications detected. Make a minimal edit before finishing."
-                )
-            # Extra guardrail: ensure there is a non-empty diff (staged or unstaged)
-            staged = subprocess.run(["git", "diff", "--staged"], capture_output=True, text=True, timeout=5)
-            unstaged = subprocess.run(["git", "diff"], capture_output=True, text=True, timeout=5)
-            if (staged.returncode == 0 and unstaged.returncode == 0 and
-                len((staged.stdout + unstaged.stdout).strip()) < 10):
-                raise ValueError(
-                    "empty_patch: Changes detected by status but no diff content. Ensure edits were written to disk."
+            try:
+                key = (os.getcwd(), os.stat(".git/index").st_mtime_ns)
+            except OSError:
+                key = (os.getcwd(), -1)
+            now = time.monotonic()
+            hit = _GIT_PROBE_CACHE.get(key)
+            if hit is not None and now - hit[0] < _GIT_PROBE_TTL:
+                probe_out = hit[1]
+            else:
+                probe = subprocess.run(
+                    ["sh", "-c", "git status --porcelain; echo ---DIFF---; git diff --staged; git diff"],
+                    capture_output=True, text=True, timeout=10,
                 )
+                probe_out = probe.stdout if probe.returncode == 0 else None
+                if probe_out is not None:
+                    _GIT_PROBE_CACHE.clear()
+                    _GIT_PROBE_CACHE[key] = (now, probe_out)
+            if probe_out is not None:
+                status_section, _, diff_section = probe_out.partition("---DIFF---")
+                if not status_section.strip():
+                    raise ValueError(
+                        "no_changes: No file modifications detected. Make a minimal edit before finishing."
+                    )
+                # Extra guardrail: ensure there is a non-empty diff (staged or unstaged)
+                if len(diff_section.strip()) < 10:
+                    raise ValueError(
+                        "empty_patch: Changes detected by status but no diff content. Ensure edits were written to disk."
+                    )
         except Exception:
             # If git is unavailable, fall back to allowing finish
             pass
@@ -169,26 +357,45 @@ class ReactAgent:
     def _sanitize_arg(self, value: str) -> str:
         if not isinstance(value, str):
             return value
-        # Remove stray argument markers accidentally included in values
-        lines = [ln for ln in value.splitlines() if ln.strip() != "----END_ARGUMENT----"]
-        return "\n".join(lines)
+        # The marker is almost never present; skip the scan entirely then.
+        # Large args (file contents for replace_in_file) used to pay a full
+        # splitlines + filter + join — 2N string allocations — every call.
+        if "----END_ARGUMENT----" not in value:
+            return value
+        # Remove any line consisting solely of the marker, in one regex pass
+        return _END_ARG_LINE_RE.sub("", value)
 
     def _normalize_response(self, text: str) -> str:
         """Make the function-call format more tolerant to minor typos.
         - Normalize any line starting with '----ARG' to the exact ARG separator
         - Collapse duplicated END markers
         """
-        lines = text.splitlines()
-        norm_lines: List[str] = []
-        for ln in lines:
-            if ln.strip().startswith("----ARG"):
-                norm_lines.append("----ARG----")
-            else:
-                norm_lines.append(ln)
-        norm_text = "\n".join(norm_lines)
-        # Collapse duplicated END markers
-        norm_text = re.sub(r"(----END_FUNCTION_CALL----)+", "----END_FUNCTION_CALL----", norm_text)
-        return norm_text
+        # Fast path: most responses already use canonical markers. Scan only
+        # the few ----ARG occurrences (C-level find) instead of splitting and
+        # re-joining the whole response, and return it untouched when every
+        # marker line is already exact and END markers are not duplicated.
+        needs_arg_norm = False
+        pos = text.find("----ARG")
+        while pos != -1:
+            line_start = text.rfind("\n", 0, pos) + 1
+            line_end = text.find("\n", pos)
+            if line_end == -1:
+                line_end = len(text)
+            line = text[line_start:line_end]
+            if line != "----ARG----" and line.strip().startswith("----ARG"):
+                needs_arg_norm = True
+                break
+            pos = text.find("----ARG", line_end)
+        if not needs_arg_norm and "----END_FUNCTION_CALL--------END_FUNCTION_CALL----" not in text:
+            return text
+
+        # Slow path: normalize ARG lines while building the list, then one
+        # precompiled sub to collapse duplicated END markers
+        norm_lines: List[str] = [
+            "----ARG----" if ln.strip().startswith("----ARG") else ln
+            for ln in text.splitlines()
+        ]
+        return _END_CALL_DEDUP_RE.sub("----END_FUNCTION_CALL----", "\n".join(norm_lines))
 
     # Required API shims
     def set_user_prompt(self, user_prompt: str) -> None:
@@ -212,7 +419,7 @@ class ReactAgent:
             "id_to_message": self.id_to_message,
         }
         with open(file_name, "w", encoding="utf-8") as f:
-            yaml.safe_dump(data, f, sort_keys=False, allow_unicode=True)
+            yaml.dump(data, f, Dumper=_YamlDumper, sort_keys=False, allow_unicode=True)
 
     def add_instructions_and_backtrack(self, instructions: str, at_message_id: int) -> str:
         """
@@ -224,91 +431,300 @@ class ReactAgent:
             at = int(at_message_id)
         except Exception:
             at = self._user_message_index
-        if 0 <= at < len(self.id_to_message):
+        if 0 <= at < len(self._roles):
             self.current_message_id = at
+            self._rebuild_transcript()
             return f"Backtracked to message {at}."
         return "Invalid backtrack id; instructions updated."
 
+    def _generate_streaming(self, prompt, no_cache: bool = False) -> str:
+        """Accumulate llm.stream() chunks, stopping at the END_CALL marker.
+
+        The agent — not the LLM wrapper — knows the parser's sentinel, so the
+        check lives here: as soon as the marker lands in the buffer tail the
+        iterator is closed, cancelling the rest of the generation instead of
+        paying output-token latency for trailing explanation the parser would
+        discard. Falls back to generate() if the stream yields nothing.
+        no_cache forwards the retry pass's cache bypass to the LLM.
+        """
+        end = self.parser.END_CALL
+        parts: List[str] = []
+        tail = ""
+        # Forward the bypass only when set so stubs/models with a plain
+        # stream(prompt) signature keep working
+        chunks = self.llm.stream(prompt, no_cache=True) if no_cache else self.llm.stream(prompt)
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                # Keep just enough tail to catch a marker split across chunks
+                tail = (tail + chunk)[-2 * len(end):]
+                if end in tail:
+                    break
+        finally:
+            chunks.close()
+        text = "".join(parts)
+        if not text:
+            return self.llm.generate(prompt, no_cache=True) if no_cache else self.llm.generate(prompt)
+        if not text.endswith(end):
+            text += end
+        return text
+
     # ---------------------------- Main loop ----------------------------
-    def run(self, task: str, max_steps: int) -> str:
+    def run(self, task: str, max_steps: int, no_cache: bool = False) -> str:
+        """Synchronous entry point: drives the async loop to completion.
+
+        Must be called from a context without a running event loop (worker
+        processes qualify); async drivers should await arun() directly.
+        no_cache bypasses the LLM response cache for every step — retry
+        passes need fresh samples, not a replay of the run that just failed.
+        """
+        return asyncio.run(self.arun(task, max_steps, no_cache))
+
+    async def arun(self, task: str, max_steps: int, no_cache: bool = False) -> str:
         # Set the task as the user prompt
         self.set_user_prompt(task)
 
-        for _ in range(max_steps):
-            prompt = self._build_context()
-            response = self.llm.generate(prompt)
-            self._add_message("assistant", response)
+        # Memo of (prompt tail, last tool output tail) states already visited.
+        # Hitting the same state again means the model would see an identical
+        # context and produce the same useless step, so force a backtrack
+        # locally instead of paying a full LLM round-trip for it.
+        seen_states: set = set()
+        last_tool_output = ""
 
-            # Parse the tool call at the end
-            try:
-                parsed = self.parser.parse(self._normalize_response(response))
-            except Exception as e:
-                # Inject corrective system guidance and continue
-                self._add_message(
-                    "system",
+        use_messages = getattr(self.llm, "accepts_messages", False)
+        use_native = self.use_native_tools and hasattr(self.llm, "generate_tool_calls")
+
+        for _ in range(max_steps):
+            self._step_ts = int(time.time())
+            # Prefer the structured transcript: the provider sees a stable,
+            # growing message prefix it can cache server-side
+            prompt = self._build_messages() if use_messages else self._build_context()
+            tail = prompt[-1]["content"] if use_messages else prompt
+            state_hash = hash((len(prompt), tail[-2048:], last_tool_output[-2048:]))
+            if state_hash in seen_states:
+                self.add_instructions_and_backtrack(
                     (
-                        "Format error: The response must end with exactly one function call using\n"
-                        f"{self.parser.BEGIN_CALL} ... {self.parser.END_CALL}.\n"
-                        "Respond again and include a tool call."
+                        "LOOP DETECTED: This exact context was already attempted.\n"
+                        "Change strategy: different search terms, different file, or a different edit window.\n"
+                        "Do NOT repeat the previous action."
                     ),
+                    self._user_message_index,
                 )
-                continue
-
-            tool_name = parsed["name"]
-            # Sanitize argument values to remove stray parser markers
-            args = {k: self._sanitize_arg(v) for k, v in parsed["arguments"].items()}
-
-            if tool_name not in self.function_map:
                 self._add_message(
-                    "system", f"Unknown tool '{tool_name}'. Available: {list(self.function_map)}"
+                    "system", "AUTO-BACKTRACK: repeated context detected; LLM call skipped."
                 )
+                last_tool_output = ""
                 continue
-
-            tool_fn = self.function_map[tool_name]
-            try:
-                result = tool_fn(**args)
-            except Exception as e:
-                hint = str(e)
-                # Simple repetition detection and pivot via backtrack
-                if tool_name == self._last_tool_name:
-                    self._last_tool_error_streak += 1
+            seen_states.add(state_hash)
+            if use_native:
+                # Structured path: the provider returns JSON tool calls, so
+                # there is no marker parsing, no normalization, and no
+                # format-error retry round-trip
+                response, calls = await asyncio.to_thread(
+                    self.llm.generate_tool_calls, prompt, self._native_tool_specs()
+                )
+                call_notes = "\n".join(
+                    f"[tool_call] {c['name']}({c['arguments']})" for c in calls
+                )
+                self._add_message("assistant", f"{response}\n{call_notes}".strip())
+                if not calls:
+                    self._add_message(
+                        "system", "No tool call returned. Respond again and call a tool."
+                    )
+                    continue
+            else:
+                # Prefer chunk streaming (early stop at END_CALL cuts the
+                # output-token tail), then a native async path, then a plain
+                # blocking call; the blocking variants run off-loop
+                if hasattr(self.llm, "stream"):
+                    response = await asyncio.to_thread(self._generate_streaming, prompt, no_cache)
+                elif hasattr(self.llm, "agenerate"):
+                    # Forward the bypass only when set so implementations with
+                    # a plain agenerate(prompt) signature keep working
+                    if no_cache:
+                        response = await self.llm.agenerate(prompt, no_cache=True)
+                    else:
+                        response = await self.llm.agenerate(prompt)
                 else:
-                    self._last_tool_name = tool_name
-                    self._last_tool_error_streak = 1
-                if self._last_tool_error_streak >= 2:
-                    instructions = (
-                        "STUCK: Previous attempts failed. Pivot strategy:\n"
-                        "1) Locate target with grep/ls-files (run_bash_cmd).\n"
-                        "2) Inspect with show_file.\n"
-                        "3) Apply minimal edit with replace_in_file.\n"
-                        "4) Immediately verify the edit landed:\n"
-                        "   - git status --porcelain && git --no-pager diff --unified=0 path/to/file\n"
-                        "   - sed -n 'START,ENDp' path/to/file\n"
-                        "5) If diff is empty or span unchanged, re-anchor (adjust window) and retry.\n"
-                        "6) Then run a focused test (pytest -q -k KEY); broaden only if it passes.\n"
-                        "Hint: If a path contains '/postgres/', try '/postgresql/'."
+                    if no_cache:
+                        response = await asyncio.to_thread(self.llm.generate, prompt, True)
+                    else:
+                        response = await asyncio.to_thread(self.llm.generate, prompt)
+                self._add_message("assistant", response)
+
+                # Parse every tool call in the response (the model may emit up to
+                # a few independent calls; executing them locally in order saves
+                # one LLM round-trip per extra call)
+                try:
+                    calls = self.parser.parse_all(self._normalize_response(response))
+                except Exception as e:
+                    # Inject corrective system guidance and continue
+                    self._add_message(
+                        "system",
+                        (
+                            "Format error: The response must end with at least one function call using\n"
+                            f"{self.parser.BEGIN_CALL} ... {self.parser.END_CALL}.\n"
+                            "Respond again and include a tool call."
+                        ),
                     )
-                    # Backtrack to user message to refresh context
-                    self.add_instructions_and_backtrack(instructions, self._user_message_index)
-                    self._add_message("system", f"AUTO-BACKTRACK applied due to repeated '{tool_name}' errors: {hint}")
-                    # Reset streak after backtrack
-                    self._last_tool_error_streak = 0
-                    self._last_tool_name = ""
                     continue
-                self._add_message("system", f"Tool '{tool_name}' error: {hint}")
-                continue
 
-            if tool_name == "finish":
+            # Pipeline: a batch made up entirely of read-only tools has no
+            # cross-call dependencies, so start every execution up front and
+            # let the (blocking, container-bound) calls overlap; the loop
+            # below then awaits each pre-started task in order, keeping all
+            # bookkeeping (dedup detection, result cache, error handling)
+            prestarted: Dict[int, Any] = {}
+            if len(calls) > 1 and all(
+                getattr(self.function_map.get(c["name"]), "side_effect_free", False)
+                for c in calls
+            ):
+                for i, c in enumerate(calls):
+                    fn = self.function_map[c["name"]]
+                    if inspect.iscoroutinefunction(fn):
+                        continue
+                    if use_native:
+                        cargs = c["arguments"]
+                    else:
+                        cargs = {k: self._sanitize_arg(v) for k, v in c["arguments"].items()}
+                    if (c["name"], tuple(sorted(cargs.items()))) in self._ro_cache:
+                        continue  # will be served from cache; nothing to run
+                    prestarted[i] = asyncio.ensure_future(asyncio.to_thread(fn, **cargs))
+
+            results_parts: List[str] = []
+            backtracked = False
+            finish_result = None
+            for idx, parsed in enumerate(calls):
+                tool_name = parsed["name"]
+                # Native calls arrive as clean JSON; text-protocol argument
+                # values may carry stray parser markers and get sanitized
+                if use_native:
+                    args = parsed["arguments"]
+                else:
+                    args = {k: self._sanitize_arg(v) for k, v in parsed["arguments"].items()}
+
+                if tool_name not in self.function_map:
+                    results_parts.append(
+                        f"Unknown tool '{tool_name}'. Available: {self._tool_names_str}"
+                    )
+                    break
+
+                # Identical-call loop detection: three repeats of the same
+                # (tool, args) within the last six calls means no progress —
+                # backtrack now instead of burning more LLM round-trips
+                if tool_name != "finish":
+                    call_hash = hash((tool_name, tuple(sorted(args.items()))))
+                    if self._recent_call_hashes.count(call_hash) >= 3:
+                        self.add_instructions_and_backtrack(
+                            (
+                                "DUPLICATE_CALLS: The same tool call was issued repeatedly with identical\n"
+                                "arguments without progressing. Change strategy: different command, different\n"
+                                "file, or a different edit window. Do NOT repeat the previous call."
+                            ),
+                            self._user_message_index,
+                        )
+                        self._add_message(
+                            "system",
+                            f"AUTO-BACKTRACK applied: '{tool_name}' repeated with identical arguments.",
+                        )
+                        self._recent_call_hashes.clear()
+                        backtracked = True
+                        break
+                    self._recent_call_hashes.append(call_hash)
+
+                tool_fn = self.function_map[tool_name]
+                # Read-only tools (tagged side_effect_free on the environment)
+                # can be answered from a small cache; any side-effecting tool
+                # may change what they would return, so it flushes the cache
+                ro_key = None
+                if getattr(tool_fn, "side_effect_free", False):
+                    ro_key = (tool_name, tuple(sorted(args.items())))
+                    cached = self._ro_cache.get(ro_key)
+                    if cached is not None:
+                        results_parts.append(
+                            f"Result:\n{cached}" if len(calls) == 1 else f"Result[{idx}]:\n{cached}"
+                        )
+                        last_tool_output = cached
+                        self._last_tool_error_streak = 0
+                        self._last_tool_name = ""
+                        continue
+                try:
+                    task = prestarted.pop(idx, None)
+                    if task is not None:
+                        result = await task
+                    elif inspect.iscoroutinefunction(tool_fn):
+                        result = await tool_fn(**args)
+                    else:
+                        # Blocking bash/git tools run off-loop
+                        result = await asyncio.to_thread(tool_fn, **args)
+                except Exception as e:
+                    hint = str(e)
+                    # Simple repetition detection and pivot via backtrack
+                    if tool_name == self._last_tool_name:
+                        self._last_tool_error_streak += 1
+                    else:
+                        self._last_tool_name = tool_name
+                        self._last_tool_error_streak = 1
+                    if self._last_tool_error_streak >= 2:
+                        instructions = (
+                            "STUCK: Previous attempts failed. Pivot strategy:\n"
+                            "1) Locate target with grep/ls-files (run_bash_cmd).\n"
+                            "2) Inspect with show_file.\n"
+                            "3) Apply minimal edit with replace_in_file.\n"
+                            "4) Immediately verify the edit landed:\n"
+                            "   - git status --porcelain && git --no-pager diff --unified=0 path/to/file\n"
+                            "   - sed -n 'START,ENDp' path/to/file\n"
+                            "5) If diff is empty or span unchanged, re-anchor (adjust window) and retry.\n"
+                            "6) Then run a focused test (pytest -q -k KEY); broaden only if it passes.\n"
+                            "Hint: If a path contains '/postgres/', try '/postgresql/'."
+                        )
+                        # Backtrack to user message to refresh context
+                        self.add_instructions_and_backtrack(instructions, self._user_message_index)
+                        self._add_message("system", f"AUTO-BACKTRACK applied due to repeated '{tool_name}' errors: {hint}")
+                        # Reset streak after backtrack
+                        self._last_tool_error_streak = 0
+                        self._last_tool_name = ""
+                        backtracked = True
+                        break
+                    results_parts.append(f"Tool '{tool_name}' error: {hint}")
+                    last_tool_output = hint
+                    # Later calls likely depend on this one; stop the batch
+                    break
+
+                if tool_name == "finish":
+                    finish_result = result
+                    break
+
+                if ro_key is not None:
+                    if len(self._ro_cache) >= 32:
+                        # Drop the oldest entry (insertion order) to stay bounded
+                        self._ro_cache.pop(next(iter(self._ro_cache)))
+                    self._ro_cache[ro_key] = str(result)
+                elif tool_name != "add_instructions_and_backtrack":
+                    # A side-effecting tool ran; cached read results are stale
+                    self._ro_cache.clear()
+
+                results_parts.append(f"Result:\n{result}" if len(calls) == 1 else f"Result[{idx}]:\n{result}")
+                last_tool_output = str(result)
+                # reset error streak on successful tool execution
+                self._last_tool_error_streak = 0
+                self._last_tool_name = ""
+
+            # A break above can leave pre-started tasks unawaited; cancel
+            # them so their (read-only) results are never silently dropped
+            # into the void with a pending-task warning
+            for task in prestarted.values():
+                task.cancel()
+
+            if finish_result is not None:
                 # reset streak after successful finish
                 self._last_tool_error_streak = 0
                 self._last_tool_name = ""
-                return result
+                return finish_result
 
-            # Record tool output to help the next step
-            self._add_message("system", f"Result:\n{result}")
-            # reset error streak on successful tool execution
-            self._last_tool_error_streak = 0
-            self._last_tool_name = ""
+            # One system message carries every result from this response
+            if not backtracked and results_parts:
+                self._add_message("system", "\n".join(results_parts))
 
         return "Agent reached maximum steps without calling finish."
 